@@ -0,0 +1,207 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+# Acumuladores que recebem uma coluna em lotes (Series do pandas) e guardam só um resumo dela,
+# sem manter os valores: usados nos indicadores (ver indicadores.py), que assim não dependem de
+# um DataFrame com todas as notas. Valores ausentes são ignorados, como nas contas do pandas.
+# O EsbocoMaiores recebe a coluna já somada por chave, para os rankings de agregacoes.py, e a
+# ContagemDistintos conta valores diferentes (tomadores por CNPJ/CPF, por exemplo).
+
+# Até quantos valores o EsbocoQuantis guarda os próprios valores (e o quantil é exato)
+LIMITE_EXATO = 1000000
+# Erro relativo máximo do quantil acima de LIMITE_EXATO
+ERRO_RELATIVO = 0.001
+# Bits do hash que escolhem o registro na ContagemDistintos (2^14 registros)
+PRECISAO_DISTINTOS = 14
+
+class Resumo:
+    # Quantidade, soma, mínimo e máximo de uma coluna numérica, e a variância pelo método de
+    # Welford: a média e a soma dos quadrados dos desvios de cada lote são combinadas com as
+    # acumuladas. Colunas inteiras (centavos) têm a soma exata, em int do Python
+    def __init__(self):
+        self.quantidade = 0
+        self.soma = 0
+        self.minimo = None
+        self.maximo = None
+        self.media = 0.0
+        self.m2 = 0.0
+
+    def adicionar(self, serie):
+        valores = serie.dropna().to_numpy(dtype=np.int64 if serie.dtype.kind in "iu" else np.float64)
+        n = len(valores)
+        if not n:
+            return
+        self.soma += valores.sum().item()
+        minimo, maximo = valores.min().item(), valores.max().item()
+        self.minimo = minimo if self.minimo is None else min(self.minimo, minimo)
+        self.maximo = maximo if self.maximo is None else max(self.maximo, maximo)
+
+        media_lote = valores.mean(dtype=np.float64)
+        m2_lote = float(((valores - media_lote) ** 2).sum())
+        total = self.quantidade + n
+        delta = media_lote - self.media
+        self.media += delta * n / total
+        self.m2 += m2_lote + delta * delta * self.quantidade * n / total
+        self.quantidade = total
+
+    def desvio_padrao(self):
+        # Desvio padrão amostral, como o std() do pandas; NaN com menos de dois valores
+        if self.quantidade < 2:
+            return float("nan")
+        return math.sqrt(self.m2 / (self.quantidade - 1))
+
+class EsbocoQuantis:
+    # Quantis (a mediana, por exemplo) de uma coluna numérica. Até `limite_exato` valores eles
+    # ficam guardados e o quantil é exato, igual ao do pandas. Acima disso os valores passam para
+    # um histograma logarítmico (DDSketch): cada valor cai em um intervalo (γ^(k-1), γ^k] e só a
+    # contagem de cada intervalo é guardada, em um dicionário. O quantil é o ponto do meio do
+    # intervalo em que ele cai, com erro relativo de até `erro_relativo`; negativos e zeros têm
+    # contagens à parte
+    def __init__(self, limite_exato=LIMITE_EXATO, erro_relativo=ERRO_RELATIVO):
+        self.limite_exato = limite_exato
+        self.gama = (1 + erro_relativo) / (1 - erro_relativo)
+        self.log_gama = math.log(self.gama)
+        self.quantidade = 0
+        self.valores = []
+        self.positivos = None
+        self.negativos = None
+        self.zeros = 0
+
+    def adicionar(self, serie):
+        valores = serie.dropna().to_numpy(dtype=np.float64)
+        if not len(valores):
+            return
+        self.quantidade += len(valores)
+        if self.positivos is None:
+            self.valores.append(valores)
+            if self.quantidade <= self.limite_exato:
+                return
+            valores = np.concatenate(self.valores)
+            self.valores = []
+            self.positivos = {}
+            self.negativos = {}
+        self._contar(valores)
+
+    def _contar(self, valores):
+        self.zeros += int((valores == 0).sum())
+        for contagens, parte in ((self.positivos, valores[valores > 0]), (self.negativos, -valores[valores < 0])):
+            intervalos, quantidades = np.unique(np.ceil(np.log(parte) / self.log_gama).astype(np.int64), return_counts=True)
+            for intervalo, quantidade in zip(intervalos.tolist(), quantidades.tolist()):
+                contagens[intervalo] = contagens.get(intervalo, 0) + quantidade
+
+    def _valor(self, intervalo):
+        return 2 * self.gama ** intervalo / (self.gama + 1)
+
+    def quantil(self, q):
+        if not self.quantidade:
+            return float("nan")
+        if self.positivos is None:
+            return float(np.quantile(np.concatenate(self.valores), q))
+        # Percorre os intervalos do menor valor para o maior até a posição do quantil
+        posicao = q * (self.quantidade - 1)
+        intervalos = ([(-self._valor(k), n) for k, n in sorted(self.negativos.items(), reverse=True)]
+                      + [(0.0, self.zeros)]
+                      + [(self._valor(k), n) for k, n in sorted(self.positivos.items())])
+        acumulado = 0
+        for valor, n in intervalos:
+            acumulado += n
+            if acumulado > posicao:
+                return valor
+        return intervalos[-1][0]
+
+    def mediana(self):
+        return self.quantil(0.5)
+
+class EsbocoMaiores:
+    # Os maiores valores de uma medida somada por chave (notas ou base de cálculo por tomador,
+    # por exemplo) com memória limitada: o resumo de Misra-Gries, a versão do Space-Saving que
+    # pode ser combinada em lotes. Recebe Series já somadas por chave (pesos não negativos) e
+    # guarda no máximo `capacidade` chaves. Quando passa disso, o valor da chave seguinte à
+    # `capacidade`-ésima é descontado de todas e as que ficam sem valor saem; o desconto vai para
+    # `erro`. A soma guardada de cada chave nunca passa da verdadeira e fica a menos de `erro`
+    # dela, que é no máximo total / (capacidade + 1): toda chave com mais do que isso é mantida
+    def __init__(self, capacidade):
+        self.capacidade = capacidade
+        self.contagens = None
+        self.total = 0
+        self.erro = 0
+
+    def adicionar(self, serie):
+        serie = serie.dropna()
+        if serie.empty:
+            return
+        self.total += serie.sum().item()
+        if self.contagens is None:
+            contagens = serie
+        else:
+            # Por concat e groupby as somas continuam inteiras (no add viram float)
+            contagens = pd.concat([self.contagens, serie]).groupby(level=0, sort=False).sum()
+        if len(contagens) > self.capacidade:
+            limiar = contagens.nlargest(self.capacidade + 1).iloc[-1]
+            contagens = contagens[contagens > limiar] - limiar
+            self.erro += limiar.item()
+        self.contagens = contagens
+
+    def estimativa(self, chave):
+        # Limite inferior da soma de `chave`; a verdadeira fica entre ele e ele + `erro`
+        if self.contagens is None or chave not in self.contagens.index:
+            return 0
+        return self.contagens[chave].item()
+
+    def maiores(self):
+        # As chaves guardadas em ordem decrescente da soma estimada
+        if self.contagens is None:
+            return pd.Series(dtype=np.int64)
+        return self.contagens.sort_index().sort_values(ascending=False)
+
+def hashes(serie):
+    # Hash de 64 bits de cada valor (sem os ausentes), pelo hash do pandas, que usa uma chave fixa:
+    # o mesmo valor cai no mesmo registro em qualquer lote
+    return pd.util.hash_pandas_object(serie.dropna(), index=False).to_numpy()
+
+class ContagemDistintos:
+    # Quantidade aproximada de valores diferentes (HyperLogLog): cada hash cai em um de 2^precisao
+    # registros pelos primeiros bits, e o registro guarda a maior posição do primeiro bit 1 no
+    # resto do hash. A estimativa sai da média harmônica dos registros, com erro padrão de
+    # 1,04 / sqrt(2^precisao) (0,8% com a precisão padrão) e 16 KB de memória, qualquer que seja
+    # a quantidade de valores. Contagens com a mesma precisão são combinadas (combinar) pelo
+    # maior valor de cada registro, o mesmo que contar todos os valores juntos
+    def __init__(self, precisao=PRECISAO_DISTINTOS):
+        self.precisao = precisao
+        self.registros = np.zeros(1 << precisao, dtype=np.uint8)
+
+    def adicionar(self, serie):
+        self.adicionar_hashes(hashes(serie))
+
+    def adicionar_hashes(self, valores):
+        if not len(valores):
+            return
+        resto_bits = 64 - self.precisao
+        indices = (valores >> np.uint64(resto_bits)).astype(np.intp)
+        resto = valores & np.uint64((1 << resto_bits) - 1)
+        # Quantidade de bits de `resto` (sem passar por float, que arredondaria), por busca binária
+        bits = np.zeros(len(resto), dtype=np.uint8)
+        for deslocamento in (32, 16, 8, 4, 2, 1):
+            maiores = resto >= np.uint64(1 << deslocamento)
+            resto = np.where(maiores, resto >> np.uint64(deslocamento), resto)
+            bits += maiores.astype(np.uint8) * deslocamento
+        bits += (resto > 0).astype(np.uint8)
+        np.maximum.at(self.registros, indices, (resto_bits + 1 - bits).astype(np.uint8))
+
+    def combinar(self, outra):
+        if outra.precisao != self.precisao:
+            raise ValueError("Contagens de distintos com precisões diferentes não podem ser combinadas")
+        np.maximum(self.registros, outra.registros, out=self.registros)
+        return self
+
+    def estimativa(self):
+        m = len(self.registros)
+        alfa = 0.7213 / (1 + 1.079 / m)
+        estimativa = alfa * m * m / np.ldexp(1.0, -self.registros.astype(np.int64)).sum()
+        vazios = int((self.registros == 0).sum())
+        if estimativa <= 2.5 * m and vazios:
+            # Poucos valores: contagem linear pelos registros vazios, mais precisa nessa faixa
+            estimativa = m * math.log(m / vazios)
+        return int(round(estimativa))
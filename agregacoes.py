@@ -0,0 +1,142 @@
+import pandas as pd
+
+from acumuladores import EsbocoMaiores
+from concentracao import Concentracao
+
+# Agrupamentos das notas por dimensão (tomador, prestador, município, UF, serviço, competência),
+# usados nos indicadores (ver indicadores.py). As notas chegam em lotes por adicionar(df_lote);
+# cada lote é agrupado por dimensão e os agrupamentos dos lotes são somados aos já acumulados,
+# de modo que só fica guardada uma linha por valor de cada dimensão, nunca as notas. Os valores
+# só são postos em ordem na consulta, uma vez, e não a cada lote.
+#
+# por(dimensao) é um DataFrame com um valor da dimensão por linha, na ordem dos valores, e as
+# colunas:
+#   quantidade      número de notas
+#   soma            soma da coluna de valor (centavos inteiros)
+#   minimo, maximo  menor e maior valor de uma nota
+# Sem a coluna de valor, só a quantidade. Notas com a dimensão vazia ficam de fora, como no
+# groupby do pandas; o resultado é o mesmo de agrupar todas as notas de uma vez.
+#
+# ranking(dimensao, medida) é uma das colunas em ordem decrescente, para os "maiores" e os top 5,
+# e concentracao(dimensao, total) as medidas de concentração da soma (ver concentracao.py).
+#
+# Uma dimensão com mais de `limite_exato` valores distintos (tomadores, em um serviço que roda
+# sem parar, por exemplo) passa a ser aproximada: em vez de uma linha por valor, ficam só os
+# `capacidade` maiores pela quantidade e pela soma (ver EsbocoMaiores), e aproximado(dimensao)
+# passa a ser verdadeiro. Aí ranking e quantidade são estimativas, abaixo das verdadeiras em no
+# máximo erro(dimensao, medida); por(dimensao) só tem os valores guardados, sem mínimo e máximo,
+# e distintos(dimensao), a quantidade de valores diferentes, fica desconhecida (None).
+# Com limite_exato=None a dimensão é sempre exata.
+
+# Quantos agrupamentos de lotes esperam antes de serem somados aos acumulados
+LOTES_PENDENTES = 8
+# Valores distintos de uma dimensão acima dos quais ela passa a ser aproximada
+LIMITE_DISTINTOS = 1000000
+# Quantos valores de uma dimensão aproximada são guardados por medida
+CAPACIDADE_MAIORES = 10000
+
+# Como cada coluna dos agrupamentos de lotes diferentes é combinada
+_COMBINAR = {"quantidade": "sum", "soma": "sum", "minimo": "min", "maximo": "max"}
+
+class Agregacoes:
+    def __init__(self, dimensoes, coluna_valor="Base de Cálculo", limite_exato=LIMITE_DISTINTOS, capacidade=CAPACIDADE_MAIORES):
+        self.dimensoes = list(dimensoes)
+        self.coluna_valor = coluna_valor
+        self.limite_exato = limite_exato
+        self.capacidade = capacidade
+        self.pendentes = {dimensao: [] for dimensao in self.dimensoes}
+        self.agregados = {}
+        self.esbocos = {}
+        self.ordenados = {}
+        self.rankings = {}
+        self.concentracoes = {}
+
+    def adicionar(self, df_lote):
+        for dimensao in self.dimensoes:
+            if dimensao not in df_lote.columns:
+                continue
+            # Colunas Categorical (ver tabela_notas.py) são agrupadas pelos códigos, só com os
+            # valores presentes no lote
+            grupos = df_lote.groupby(dimensao, sort=False, observed=True)
+            # A quantidade sai de size() para continuar int64 (no agg ela viraria Int64); as
+            # duas contas usam o mesmo agrupamento, que só é calculado uma vez
+            agregado = grupos.size().to_frame("quantidade")
+            if self.coluna_valor in df_lote.columns:
+                valores = grupos[self.coluna_valor].agg(soma="sum", minimo="min", maximo="max")
+                agregado = pd.concat([agregado, valores], axis=1)
+            if isinstance(agregado.index, pd.CategoricalIndex):
+                # As categorias mudam de um lote para outro: com os próprios valores no índice,
+                # os lotes se juntam e são ordenados como qualquer texto
+                agregado.index = agregado.index.astype(object)
+            self.pendentes[dimensao].append(agregado)
+            if len(self.pendentes[dimensao]) >= LOTES_PENDENTES:
+                self._combinar(dimensao)
+        self.ordenados = {}
+        self.rankings = {}
+        self.concentracoes = {}
+
+    def _combinar(self, dimensao):
+        partes = self.pendentes[dimensao]
+        if dimensao in self.agregados:
+            partes.insert(0, self.agregados[dimensao])
+        if len(partes) == 1:
+            combinado = partes[0]
+        elif partes:
+            juntas = pd.concat(partes)
+            combinado = juntas.groupby(level=0, sort=False).agg({coluna: _COMBINAR[coluna] for coluna in juntas.columns})
+        else:
+            return
+        self.pendentes[dimensao] = []
+
+        if dimensao not in self.esbocos and self.limite_exato is not None and len(combinado) > self.limite_exato:
+            # Passa a aproximada: os esboços começam pelo que já foi agrupado
+            self.esbocos[dimensao] = {medida: EsbocoMaiores(self.capacidade) for medida in ("quantidade", "soma")
+                                      if medida in combinado.columns}
+            self.agregados.pop(dimensao, None)
+        if dimensao in self.esbocos:
+            for medida, esboco in self.esbocos[dimensao].items():
+                esboco.adicionar(combinado[medida])
+        else:
+            self.agregados[dimensao] = combinado
+
+    def aproximado(self, dimensao):
+        self._combinar(dimensao)
+        return dimensao in self.esbocos
+
+    def erro(self, dimensao, medida):
+        # Quanto as estimativas da medida podem estar abaixo das verdadeiras (0 se exata)
+        return self.esbocos[dimensao][medida].erro if self.aproximado(dimensao) else 0
+
+    def por(self, dimensao):
+        if dimensao not in self.ordenados:
+            if self.aproximado(dimensao):
+                guardados = {medida: esboco.contagens for medida, esboco in self.esbocos[dimensao].items()}
+                self.ordenados[dimensao] = pd.concat(guardados, axis=1).fillna(0).sort_index()
+            else:
+                self.ordenados[dimensao] = self.agregados[dimensao].sort_index()
+        return self.ordenados[dimensao]
+
+    def ranking(self, dimensao, medida):
+        chave = (dimensao, medida)
+        if chave not in self.rankings:
+            if self.aproximado(dimensao):
+                self.rankings[chave] = self.esbocos[dimensao][medida].maiores()
+            else:
+                self.rankings[chave] = self.por(dimensao)[medida].sort_values(ascending=False)
+        return self.rankings[chave]
+
+    def concentracao(self, dimensao, total):
+        chave = (dimensao, total)
+        if chave not in self.concentracoes:
+            self.concentracoes[chave] = Concentracao(self.ranking(dimensao, "soma"), total)
+        return self.concentracoes[chave]
+
+    def distintos(self, dimensao):
+        # Quantidade de valores diferentes da dimensão; None se ela for aproximada
+        return None if self.aproximado(dimensao) else len(self.por(dimensao))
+
+    def quantidade(self, dimensao, valor):
+        # Notas de um valor da dimensão
+        if self.aproximado(dimensao):
+            return self.esbocos[dimensao]["quantidade"].estimativa(valor)
+        return int(self.por(dimensao).at[valor, "quantidade"])
@@ -1,4 +1,4 @@
-import xmltodict
+import xml_backend
 import os
 import logging
 import sys
@@ -19,8 +19,8 @@ def analyze_xml_structure(xml_file_path):
         logging.info(f"Analisando estrutura do arquivo: {xml_file_path}")
         
         with open(xml_file_path, "rb") as xml_file:
-            logging.info("Arquivo aberto, iniciando parse XML")
-            xml_dict = xmltodict.parse(xml_file)
+            logging.info(f"Arquivo aberto, iniciando parse XML ({xml_backend.backend()})")
+            xml_dict = xml_backend.parse(xml_file)
             logging.info("Parse XML concluído")
             
             # Verifica se é uma NFSe de Serviço Prestado
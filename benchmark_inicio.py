@@ -0,0 +1,112 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+# Mede o tempo de início da interface (easyxml_gui.py) e do terminal (main.py) e quanto custa
+# importar cada módulo, para manter o início dentro de um orçamento. Cada medição roda em um
+# processo novo do Python, com -X importtime, e vale a menor das repetições. Na interface mede
+# também o tempo até a janela aparecer, se houver tela. Termina com código 1 se algum tempo
+# passar do orçamento.
+#
+#   python benchmark_inicio.py
+#   python benchmark_inicio.py --modulos 20 --repeticoes 5
+#   python benchmark_inicio.py --orcamento-interface 0.2 --orcamento-terminal 0.2
+
+# Orçamentos padrão, em segundos, da importação de cada módulo e da janela da interface
+ORCAMENTO_INTERFACE = 0.25
+ORCAMENTO_TERMINAL = 0.25
+ORCAMENTO_JANELA = 0.5
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+
+# Linha do -X importtime: "import time: <próprio> | <acumulado> | <espaços><módulo>", em µs
+_LINHA_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+# Abre a janela da interface, espera que ela seja desenhada e a fecha
+_CODIGO_JANELA = """
+import time
+inicio = time.perf_counter()
+import tkinter as tk
+import easyxml_gui
+root = tk.Tk()
+app = easyxml_gui.EasyXMLApp(root)
+root.update()
+print(time.perf_counter() - inicio)
+app.close()
+"""
+
+def _python(codigo, *opcoes):
+    return subprocess.run([sys.executable, *opcoes, "-c", codigo], cwd=DIRETORIO, capture_output=True, text=True)
+
+def medir_importacao(modulo, repeticoes):
+    # Tempo total de importação do módulo e o acumulado de cada módulo importado diretamente por
+    # ele, em segundos, na repetição mais rápida
+    melhor = None
+    for _ in range(repeticoes):
+        resultado = _python(f"import {modulo}", "-X", "importtime")
+        if resultado.returncode != 0:
+            raise RuntimeError(f"Erro ao importar {modulo}:\n{resultado.stderr}")
+        total = None
+        diretos = {}
+        for linha in resultado.stderr.splitlines():
+            encontrado = _LINHA_IMPORTTIME.match(linha)
+            if not encontrado:
+                continue
+            acumulado, nivel, nome = int(encontrado.group(2)) / 1e6, len(encontrado.group(3)), encontrado.group(4)
+            if nivel == 1 and nome == modulo:
+                total = acumulado
+            elif nivel == 3:
+                diretos[nome] = acumulado
+        if total is not None and (melhor is None or total < melhor[0]):
+            melhor = (total, diretos)
+    return melhor
+
+def medir_janela(repeticoes):
+    # Tempo até a janela da interface ser desenhada, ou None sem tela
+    tempos = []
+    for _ in range(repeticoes):
+        resultado = _python(_CODIGO_JANELA)
+        if resultado.returncode != 0:
+            if "TclError" in resultado.stderr:
+                return None
+            raise RuntimeError(f"Erro ao abrir a interface:\n{resultado.stderr}")
+        tempos.append(float(resultado.stdout.strip().splitlines()[-1]))
+    return min(tempos)
+
+def relatar(nome, modulo, medicao, orcamento, quantidade_modulos):
+    total, diretos = medicao
+    situacao = "OK" if total <= orcamento else "ACIMA DO ORÇAMENTO"
+    print(f"\n{nome}: importar {modulo} leva {total * 1000:.0f} ms (orçamento: {orcamento * 1000:.0f} ms) - {situacao}")
+    print(f"{'Módulo':<40} {'Tempo (ms)':>10}")
+    for dependencia, acumulado in sorted(diretos.items(), key=lambda item: item[1], reverse=True)[:quantidade_modulos]:
+        print(f"{dependencia:<40} {acumulado * 1000:>10.1f}")
+    return total <= orcamento
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede o tempo de início da interface e do terminal do EasyXML")
+    parser.add_argument("--repeticoes", type=int, default=3, help="repetições de cada medição (padrão: 3)")
+    parser.add_argument("--modulos", type=int, default=10, help="quantos módulos mais lentos mostrar (padrão: 10)")
+    parser.add_argument("--orcamento-interface", type=float, default=ORCAMENTO_INTERFACE,
+                        help=f"segundos para importar a interface (padrão: {ORCAMENTO_INTERFACE})")
+    parser.add_argument("--orcamento-terminal", type=float, default=ORCAMENTO_TERMINAL,
+                        help=f"segundos para importar o módulo principal (padrão: {ORCAMENTO_TERMINAL})")
+    parser.add_argument("--orcamento-janela", type=float, default=ORCAMENTO_JANELA,
+                        help=f"segundos até a janela da interface aparecer (padrão: {ORCAMENTO_JANELA})")
+    args = parser.parse_args()
+
+    dentro = relatar("Interface", "easyxml_gui", medir_importacao("easyxml_gui", args.repeticoes),
+                     args.orcamento_interface, args.modulos)
+    dentro &= relatar("Terminal", "main", medir_importacao("main", args.repeticoes),
+                      args.orcamento_terminal, args.modulos)
+
+    janela = medir_janela(args.repeticoes)
+    if janela is None:
+        print("\nJanela: sem tela disponível, tempo não medido")
+    else:
+        situacao = "OK" if janela <= args.orcamento_janela else "ACIMA DO ORÇAMENTO"
+        print(f"\nJanela: aparece em {janela * 1000:.0f} ms (orçamento: {args.orcamento_janela * 1000:.0f} ms) - {situacao}")
+        dentro &= janela <= args.orcamento_janela
+
+    sys.exit(0 if dentro else 1)
@@ -0,0 +1,118 @@
+import argparse
+import copy
+import json
+import logging
+import os
+import tempfile
+import time
+
+import xml_backend
+import main
+
+# Compara o tempo de leitura de um arquivo de NFSe de Serviço Prestado em cada backend de XML
+# disponível (ver xml_backend.py). Sem arquivo informado, gera um arquivo de teste a partir da
+# estrutura de exemplo em estrutura_nota_detalhada.json.
+#
+#   python benchmark_parse.py                      (gera um arquivo com 10000 notas)
+#   python benchmark_parse.py nfs/arquivo.xml
+#   python benchmark_parse.py --notas 50000 --repeticoes 5
+
+def gerar_arquivo_teste(caminho, quantidade_notas):
+    # Repete a nota de exemplo variando número, valores e tomador
+    import xmltodict
+
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "estrutura_nota_detalhada.json"), encoding="utf-8") as arquivo:
+        modelo = json.load(arquivo)
+
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        arquivo.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        arquivo.write('<ConsultarNfseServicoPrestadoResposta xmlns="http://www.abrasf.org.br/nfse.xsd"><ListaNfse>\n')
+        for i in range(quantidade_notas):
+            nota = copy.deepcopy(modelo)
+            nota["@Id"] = str(i + 1)
+            nota["Numero"] = f"2022{i:011d}"
+            base_calculo = (i * 7919) % 1000000 / 100
+            nota["ValoresNfse"]["BaseCalculo"] = f"{base_calculo:.2f}"
+            nota["ValoresNfse"]["ValorIss"] = f"{base_calculo * 0.03:.2f}"
+            declaracao = nota["DeclaracaoPrestacaoServico"]["InfDeclaracaoPrestacaoServico"]
+            declaracao["Servico"]["Valores"]["ValorServicos"] = f"{base_calculo:.2f}"
+            declaracao["Tomador"]["RazaoSocial"] = f"CLIENTE {i % 500:03d} LTDA"
+            comp_nfse = {"CompNfse": {"Nfse": {"@versao": "2.02", "InfNfse": nota}}}
+            arquivo.write(xmltodict.unparse(comp_nfse, full_document=False))
+            arquivo.write("\n")
+        arquivo.write("</ListaNfse></ConsultarNfseServicoPrestadoResposta>\n")
+
+def ler_xmltodict(caminho, extrair):
+    # Caminho original: monta o documento inteiro em dicionários e depois percorre as notas
+    with open(caminho, "rb") as xml_file:
+        xml_dict = xml_backend.parse(xml_file)
+    lista_nfse = xml_dict["ConsultarNfseServicoPrestadoResposta"]["ListaNfse"]["CompNfse"]
+    if not isinstance(lista_nfse, list):
+        lista_nfse = [lista_nfse]
+    if not extrair:
+        return len(lista_nfse), []
+    return len(lista_nfse), [main.extrair_nota_servico_prestado(comp_nfse) for comp_nfse in lista_nfse]
+
+def ler_streaming(caminho, extrair):
+    # lxml/etree: lê um CompNfse por vez e extrai direto do elemento
+    quantidade = 0
+    linhas = []
+    with open(caminho, "rb") as xml_file:
+        for comp_nfse in main.iterar_comp_nfse(xml_file):
+            quantidade += 1
+            if extrair:
+                linhas.append(main.extrair_elemento_servico_prestado(comp_nfse))
+    return quantidade, linhas
+
+def medir(caminho, backend, extrair, repeticoes):
+    # Menor tempo entre as repetições, para reduzir o ruído de outros processos
+    xml_backend.usar_backend(backend)
+    leitor = ler_xmltodict if backend == "xmltodict" else ler_streaming
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        quantidade, linhas = leitor(caminho, extrair)
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    return melhor, quantidade, linhas
+
+def executar(caminho, repeticoes):
+    tamanho_mb = os.path.getsize(caminho) / (1024 * 1024)
+    print(f"Arquivo: {caminho} ({tamanho_mb:.1f} MB)")
+    print(f"{'Backend':<10} {'Notas':>8} {'Leitura (s)':>12} {'Leitura + extração (s)':>24} {'Ganho':>7}")
+
+    referencia = None
+    linhas_referencia = None
+    # O xmltodict vem primeiro para servir de referência de tempo e de resultado
+    for backend in reversed(xml_backend.BACKENDS):
+        if not xml_backend.backend_disponivel(backend):
+            print(f"{backend:<10} {'não instalado':>8}")
+            continue
+        tempo_leitura, quantidade, _ = medir(caminho, backend, False, repeticoes)
+        tempo_total, _, linhas = medir(caminho, backend, True, repeticoes)
+        if backend == "xmltodict":
+            referencia = tempo_total
+            linhas_referencia = linhas
+        ganho = f"{referencia / tempo_total:.1f}x" if referencia else "-"
+        print(f"{backend:<10} {quantidade:>8} {tempo_leitura:>12.2f} {tempo_total:>24.2f} {ganho:>7}")
+        if linhas_referencia is not None and linhas != linhas_referencia:
+            print(f"ATENÇÃO: as linhas extraídas com {backend} são diferentes das do xmltodict")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara os backends de leitura de XML do EasyXML")
+    parser.add_argument("arquivo", nargs="?", help="XML de NFSe de Serviço Prestado (padrão: gera um arquivo de teste)")
+    parser.add_argument("--notas", type=int, default=10000, help="quantidade de notas do arquivo gerado (padrão: 10000)")
+    parser.add_argument("--repeticoes", type=int, default=3, help="repetições de cada medição (padrão: 3)")
+    args = parser.parse_args()
+
+    # O log de depuração de cada nota distorceria a medição
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.arquivo:
+        executar(args.arquivo, args.repeticoes)
+    else:
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, f"nfse_{args.notas}_notas.xml")
+            print(f"Gerando arquivo de teste com {args.notas} notas...")
+            gerar_arquivo_teste(caminho, args.notas)
+            executar(caminho, args.repeticoes)
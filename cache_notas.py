@@ -0,0 +1,129 @@
+import os
+import json
+import gzip
+import pickle
+import hashlib
+import logging
+
+# Cache das linhas extraídas de cada XML, para que as execuções seguintes só leiam os arquivos
+# novos ou alterados. O manifesto (manifesto.json) guarda, para cada arquivo, o caminho, o
+# tamanho, a data de modificação e o hash do conteúdo. As linhas ficam em linhas/<hash>.pkl.gz,
+# gravadas como a tabela de notas de cada arquivo (por coluna, ver tabela_notas.py) e
+# compactadas; arquivos com o mesmo conteúdo (cópias, arquivos renomeados) usam a mesma entrada.
+
+ARQUIVO_MANIFESTO = "manifesto.json"
+TAMANHO_BLOCO_HASH = 1024 * 1024
+
+def calcular_hash(caminho):
+    # Hash do conteúdo do arquivo, lido em blocos para não carregar arquivos grandes inteiros
+    resumo = hashlib.blake2b(digest_size=20)
+    with open(caminho, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO_HASH), b""):
+            resumo.update(bloco)
+    return resumo.hexdigest()
+
+def _gravar_atomico(caminho, dados):
+    # Grava em um arquivo temporário e troca de uma vez, para nunca deixar um arquivo pela metade
+    temporario = caminho + ".tmp"
+    with open(temporario, "wb") as arquivo:
+        arquivo.write(dados)
+    os.replace(temporario, caminho)
+
+class CacheNotas:
+    def __init__(self, diretorio, versao):
+        # `versao` identifica a extração que gerou as linhas: se mudar, o cache é descartado
+        self.diretorio = diretorio
+        self.diretorio_linhas = os.path.join(diretorio, "linhas")
+        self.versao = versao
+        self.arquivos = {}
+        self.consultados = {}
+        self._carregar_manifesto()
+
+    def _carregar_manifesto(self):
+        # Sem um manifesto válido da versão atual, as linhas guardadas não são confiáveis
+        try:
+            with open(os.path.join(self.diretorio, ARQUIVO_MANIFESTO), encoding="utf-8") as arquivo:
+                manifesto = json.load(arquivo)
+        except FileNotFoundError:
+            self._limpar_linhas()
+            return
+        except (OSError, ValueError) as e:
+            logging.warning("Não foi possível ler o manifesto do cache, os arquivos serão lidos novamente: %s", e)
+            self._limpar_linhas()
+            return
+
+        if manifesto.get("versao") != self.versao:
+            logging.info("A extração mudou desde a última execução, os arquivos serão lidos novamente")
+            self._limpar_linhas()
+            return
+        self.arquivos = manifesto.get("arquivos", {})
+
+    def _limpar_linhas(self, manter=()):
+        if not os.path.isdir(self.diretorio_linhas):
+            return
+        for nome in os.listdir(self.diretorio_linhas):
+            if nome not in manter:
+                try:
+                    os.remove(os.path.join(self.diretorio_linhas, nome))
+                except OSError:
+                    pass
+
+    def _caminho_linhas(self, hash_conteudo):
+        return os.path.join(self.diretorio_linhas, hash_conteudo + ".pkl.gz")
+
+    def consultar(self, caminho):
+        # Verifica se as linhas do arquivo estão no cache. O hash só é recalculado quando o
+        # tamanho ou a data de modificação mudaram desde a última execução
+        chave = os.path.abspath(caminho)
+        estado = os.stat(caminho)
+        entrada = self.arquivos.get(chave)
+        if entrada and entrada["tamanho"] == estado.st_size and entrada["mtime_ns"] == estado.st_mtime_ns:
+            hash_conteudo = entrada["hash"]
+        else:
+            hash_conteudo = calcular_hash(caminho)
+
+        self.consultados[chave] = {"tamanho": estado.st_size, "mtime_ns": estado.st_mtime_ns, "hash": hash_conteudo}
+        return os.path.exists(self._caminho_linhas(hash_conteudo))
+
+    def ler(self, caminho):
+        # Linhas do arquivo guardadas no cache, ou None se não for possível lê-las
+        entrada = self.consultados.get(os.path.abspath(caminho))
+        if entrada is None:
+            return None
+        try:
+            with gzip.open(self._caminho_linhas(entrada["hash"]), "rb") as arquivo:
+                return pickle.load(arquivo)
+        except Exception as e:
+            logging.warning("Cache do arquivo %s ilegível, o arquivo será lido novamente: %s", caminho, e)
+            return None
+
+    def guardar(self, caminho, linhas):
+        # Guarda as linhas extraídas de um arquivo já consultado. Arquivos sem linhas não vão
+        # para o cache, assim os erros continuam aparecendo no log a cada execução
+        entrada = self.consultados.get(os.path.abspath(caminho))
+        if entrada is None or not linhas:
+            return
+        try:
+            os.makedirs(self.diretorio_linhas, exist_ok=True)
+            _gravar_atomico(self._caminho_linhas(entrada["hash"]),
+                            gzip.compress(pickle.dumps(linhas, protocol=pickle.HIGHEST_PROTOCOL), compresslevel=1))
+        except OSError as e:
+            logging.warning("Não foi possível guardar o arquivo %s no cache: %s", caminho, e)
+
+    def salvar(self):
+        # Grava o manifesto com os arquivos vistos nesta execução e os das anteriores que ainda
+        # existem (de outro diretório de entrada com o mesmo destino, por exemplo), e apaga do
+        # cache as linhas de arquivos que não existem mais
+        arquivos = {chave: entrada for chave, entrada in self.arquivos.items()
+                    if chave not in self.consultados and os.path.exists(chave)}
+        arquivos.update(self.consultados)
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            manifesto = {"versao": self.versao, "arquivos": arquivos}
+            _gravar_atomico(os.path.join(self.diretorio, ARQUIVO_MANIFESTO),
+                            json.dumps(manifesto, ensure_ascii=False, indent=1).encode("utf-8"))
+        except OSError as e:
+            logging.warning("Não foi possível gravar o manifesto do cache: %s", e)
+            return
+
+        self._limpar_linhas(manter={entrada["hash"] + ".pkl.gz" for entrada in arquivos.values()})
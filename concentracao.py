@@ -0,0 +1,50 @@
+import numpy as np
+
+# Medidas de concentração do faturamento entre os valores de uma dimensão (tomadores, serviços,
+# municípios...), usadas nos indicadores (ver indicadores.py e Agregacoes.concentracao). Recebem
+# a soma de cada valor da dimensão em ordem decrescente (o ranking de agregacoes.py) e fazem as
+# contas com ordenação e somas acumuladas do numpy, sem percorrer os valores em Python.
+#
+# As participações (top N e quantos valores chegam a uma fração do faturamento) são relativas ao
+# `total` informado, o faturamento de todas as notas; Gini e HHI, que medem a distribuição entre
+# os valores da dimensão, são relativos à soma deles.
+
+class Concentracao:
+    def __init__(self, valores, total):
+        self.valores = valores.to_numpy(dtype=np.int64 if valores.dtype.kind in "iu" else np.float64)
+        self.total = total
+        self.acumulado = np.cumsum(self.valores)
+
+    def participacao_top(self, n):
+        # Percentual do total nos `n` maiores valores
+        if not len(self.valores) or self.total <= 0:
+            return 0
+        return self.acumulado[min(n, len(self.valores)) - 1] / self.total * 100
+
+    def quantidade_para(self, fracao=0.8):
+        # Quantos dos maiores valores somam ao menos `fracao` do total (todos, se não chegarem)
+        if not len(self.valores):
+            return 0
+        atingiu = self.acumulado >= self.total * fracao
+        return int(atingiu.argmax()) + 1 if atingiu.any() else len(self.valores)
+
+    def gini(self):
+        # Índice de Gini: 0 com todos os valores iguais, perto de 1 com tudo em um só. Com os
+        # valores em ordem crescente x1..xn, Σ(n+1-i)·xi é a soma das somas acumuladas, feita em
+        # float para não estourar o int64 com muitos valores
+        n = len(self.valores)
+        soma = self.acumulado[-1] if n else 0
+        if n < 2 or soma <= 0:
+            return 0
+        crescentes = np.sort(self.valores)
+        soma_ponderada = np.cumsum(crescentes, dtype=np.float64).sum()
+        return float((n + 1 - 2 * soma_ponderada / soma) / n)
+
+    def hhi(self):
+        # Índice Herfindahl-Hirschman: soma dos quadrados das participações em pontos percentuais,
+        # de perto de 0 (muito pulverizado) a 10.000 (um só valor)
+        soma = self.acumulado[-1] if len(self.valores) else 0
+        if soma <= 0:
+            return 0
+        participacoes = self.valores / soma * 100
+        return float((participacoes * participacoes).sum())
@@ -7,7 +7,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('icon.ico', '.'), ('icon.png', '.')],
-    hiddenimports=['pandas', 'openpyxl', 'xmltodict'],
+    hiddenimports=['pandas', 'xlsxwriter', 'xmltodict', 'lxml.etree'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -1,37 +1,31 @@
 import os
-import sys
+import multiprocessing
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-import threading
+import queue
 import logging
-import traceback
 from datetime import datetime
 
-# Configuração de logging
-log_file = f"easyxml_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# A interface não importa o módulo principal (main.py) nem o pandas: eles só são carregados no
+# processo de execucao.py, aberto em segundo plano depois que a janela é criada. Importar este
+# arquivo não tem efeitos: o log é configurado só ao executá-lo (ver o final do arquivo), o que
+# também evita que o processo de execucao.py, que o importa de novo ao ser criado, abra outro
+# arquivo de log. O tempo de início pode ser medido com benchmark_inicio.py
+import opcoes
+import progresso
+import registro
+from execucao import Execucao
 
-# Importa o módulo principal
-try:
-    import main as easyxml
-    logging.info("Módulo EasyXML importado com sucesso")
-except ImportError as e:
-    logging.error(f"Erro ao importar o módulo EasyXML: {str(e)}")
-    messagebox.showerror("Erro", f"Erro ao carregar o módulo principal: {str(e)}")
-    sys.exit(1)
+# Intervalo, em milissegundos, entre as leituras da fila de eventos do processamento
+INTERVALO_EVENTOS_MS = 100
+# Parte da barra de progresso que corresponde à leitura dos XMLs; o restante é o salvamento
+PARTE_LEITURA = 95
 
 class EasyXMLApp:
     def __init__(self, root):
         self.root = root
         self.root.title("EasyXML - Processador de Notas Fiscais")
-        self.root.geometry("600x400")
+        self.root.geometry("600x450")
         self.root.resizable(True, True)
         
         # Configura o ícone se disponível
@@ -40,6 +34,13 @@ class EasyXMLApp:
         except:
             pass
         
+        # O processamento roda em um processo à parte, aberto desde já e reaproveitado entre as
+        # execuções (ver execucao.py). Os eventos dele (ver progresso.py) chegam por uma fila e
+        # são aplicados na thread do Tk, em verificar_eventos
+        self.execucao = Execucao()
+        self.processando = False
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        
         self.setup_ui()
     
     def setup_ui(self):
@@ -59,7 +60,7 @@ class EasyXMLApp:
         dir_frame = ttk.LabelFrame(main_frame, text="Diretório de XMLs", padding="10")
         dir_frame.pack(fill=tk.X, pady=10)
         
-        self.dir_var = tk.StringVar(value=os.path.join(os.getcwd(), "nfs"))
+        self.dir_var = tk.StringVar(value=os.path.join(os.getcwd(), opcoes.DIRETORIO_ENTRADA))
         dir_entry = ttk.Entry(dir_frame, textvariable=self.dir_var, width=50)
         dir_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
         
@@ -70,13 +71,23 @@ class EasyXMLApp:
         output_frame = ttk.LabelFrame(main_frame, text="Diretório de Saída", padding="10")
         output_frame.pack(fill=tk.X, pady=10)
         
-        self.output_var = tk.StringVar(value=os.path.join(os.getcwd(), "Notas_Processadas"))
+        self.output_var = tk.StringVar(value=os.path.join(os.getcwd(), opcoes.DIRETORIO_SAIDA))
         output_entry = ttk.Entry(output_frame, textvariable=self.output_var, width=50)
         output_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
         
         output_btn = ttk.Button(output_frame, text="Procurar...", command=self.browse_output)
         output_btn.pack(side=tk.RIGHT)
         
+        # Formato do arquivo gerado
+        format_frame = ttk.Frame(main_frame)
+        format_frame.pack(fill=tk.X)
+        ttk.Label(format_frame, text="Formato de saída:").pack(side=tk.LEFT, padx=(0, 5))
+        self.formatos = {f"{nome} (.{formato})": formato for formato, nome in opcoes.FORMATOS_SAIDA.items()
+                         if opcoes.formato_disponivel(formato)}
+        self.format_var = tk.StringVar(value=next(iter(self.formatos)))
+        format_combo = ttk.Combobox(format_frame, textvariable=self.format_var, values=list(self.formatos), state="readonly", width=20)
+        format_combo.pack(side=tk.LEFT)
+        
         # Barra de progresso
         progress_frame = ttk.Frame(main_frame)
         progress_frame.pack(fill=tk.X, pady=10)
@@ -93,13 +104,16 @@ class EasyXMLApp:
         btn_frame = ttk.Frame(main_frame)
         btn_frame.pack(fill=tk.X, pady=10)
         
-        process_btn = ttk.Button(btn_frame, text="Processar XMLs", command=self.process_xml)
-        process_btn.pack(side=tk.LEFT, padx=5)
+        self.process_btn = ttk.Button(btn_frame, text="Processar XMLs", command=self.process_xml)
+        self.process_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.cancel_btn = ttk.Button(btn_frame, text="Cancelar", command=self.cancel_processing, state=tk.DISABLED)
+        self.cancel_btn.pack(side=tk.LEFT, padx=5)
         
         open_output_btn = ttk.Button(btn_frame, text="Abrir Pasta de Saída", command=self.open_output_folder)
         open_output_btn.pack(side=tk.LEFT, padx=5)
         
-        exit_btn = ttk.Button(btn_frame, text="Sair", command=self.root.destroy)
+        exit_btn = ttk.Button(btn_frame, text="Sair", command=self.close)
         exit_btn.pack(side=tk.RIGHT, padx=5)
         
         # Informações
@@ -108,9 +122,10 @@ class EasyXMLApp:
         
         info_text = "Instruções:\n\n"
         info_text += "1. Selecione o diretório contendo os arquivos XML de notas fiscais\n"
-        info_text += "2. Selecione o diretório de saída para os arquivos Excel\n"
-        info_text += "3. Clique em 'Processar XMLs' para iniciar o processamento\n\n"
-        info_text += "O aplicativo processará todos os arquivos XML e gerará um relatório Excel."
+        info_text += "2. Selecione o diretório de saída para os arquivos gerados\n"
+        info_text += "3. Escolha o formato: Excel (com indicadores), Parquet, CSV ou Arrow\n"
+        info_text += "4. Clique em 'Processar XMLs' para iniciar o processamento\n\n"
+        info_text += "O aplicativo processará todos os arquivos XML e gerará o relatório no formato escolhido."
         
         info_label = ttk.Label(info_frame, text=info_text, justify=tk.LEFT)
         info_label.pack(anchor=tk.W)
@@ -137,13 +152,63 @@ class EasyXMLApp:
             messagebox.showinfo("Informação", "O diretório de saída ainda não existe.")
     
     def update_progress(self, value, status):
+        # Só pode ser chamada pela thread do Tk
         self.progress_var.set(value)
         self.status_var.set(status)
-        self.root.update_idletasks()
+    
+    def set_running(self, running):
+        self.processando = running
+        self.process_btn.config(state=tk.DISABLED if running else tk.NORMAL)
+        self.cancel_btn.config(state=tk.NORMAL if running else tk.DISABLED)
+    
+    def verificar_eventos(self):
+        # Aplica todos os eventos pendentes e volta a verificar enquanto houver processamento
+        try:
+            while self.processando:
+                self.aplicar_evento(self.execucao.eventos.get_nowait())
+        except queue.Empty:
+            # O processo terminou sem publicar o fim da execução
+            falha = self.execucao.falha()
+            if falha is not None:
+                self.aplicar_evento({"etapa": progresso.ETAPA_FIM, "erro": str(falha) or type(falha).__name__, "cancelado": False})
+        if self.processando:
+            self.root.after(INTERVALO_EVENTOS_MS, self.verificar_eventos)
+    
+    def aplicar_evento(self, evento):
+        etapa = evento["etapa"]
+        if etapa == progresso.ETAPA_FIM:
+            self.set_running(False)
+            erro = evento["erro"]
+            if evento["cancelado"]:
+                self.update_progress(0, "Processamento cancelado")
+            elif erro is None:
+                self.update_progress(100, "Processamento concluído com sucesso!")
+                messagebox.showinfo("Sucesso", "Processamento concluído com sucesso!")
+            else:
+                self.update_progress(0, f"Erro: {erro}")
+                messagebox.showerror("Erro", f"Ocorreu um erro durante o processamento: {erro}")
+        elif not self.processando or self.execucao.cancelamento.is_set():
+            # Eventos que chegam depois do pedido de cancelamento
+            pass
+        elif etapa == progresso.ETAPA_LENDO:
+            status = f"{etapa}: {evento['arquivos']} de {evento['total_arquivos']} - {evento['notas']} notas"
+            status += f" - {evento['bytes'] / 1024**2:.0f} de {evento['total_bytes'] / 1024**2:.0f} MB"
+            if evento["restante"] is not None:
+                status += f" - Tempo restante estimado: {progresso.formatar_tempo(evento['restante'])}"
+            self.update_progress(evento["fracao"] * PARTE_LEITURA, status)
+        elif etapa == progresso.ETAPA_SALVANDO:
+            # O salvamento não é interrompido no meio, para não deixar o arquivo incompleto
+            self.cancel_btn.config(state=tk.DISABLED)
+            self.update_progress(PARTE_LEITURA, f"Salvando {evento['notas']} notas...")
+        elif etapa == progresso.ETAPA_CONCLUIDO:
+            self.update_progress(100, f"{evento['notas']} notas processadas")
+        else:
+            self.update_progress(0, f"{etapa}...")
     
     def process_xml(self):
         input_dir = self.dir_var.get()
         output_dir = self.output_var.get()
+        formato = self.formatos[self.format_var.get()]
         
         # Verifica se o diretório de entrada existe
         if not os.path.exists(input_dir):
@@ -171,55 +236,37 @@ class EasyXMLApp:
             messagebox.showwarning("Aviso", f"Não foram encontrados arquivos XML no diretório '{input_dir}'.")
             return
         
-        # Inicia o processamento em uma thread separada
-        self.update_progress(0, f"Iniciando processamento de {len(xml_files)} arquivos XML...")
-        
-        def process_thread():
-            try:
-                # Modifica as variáveis globais para os diretórios selecionados
-                original_nfs_dir = "nfs"
-                original_output_dir = "Notas_Processadas"
-                
-                # Substitui os diretórios no código
-                easyxml.diretorio_saida = output_dir
-                
-                # Copia os arquivos XML para o diretório nfs se necessário
-                if input_dir != os.path.join(os.getcwd(), "nfs"):
-                    # Se o diretório de entrada não for o padrão, copia os arquivos
-                    if not os.path.exists("nfs"):
-                        os.makedirs("nfs")
-                    
-                    self.update_progress(10, "Preparando arquivos XML...")
-                    for i, xml_file in enumerate(xml_files):
-                        src_path = os.path.join(input_dir, xml_file)
-                        dst_path = os.path.join("nfs", xml_file)
-                        
-                        # Se o arquivo já existe no destino, não copia
-                        if not os.path.exists(dst_path):
-                            import shutil
-                            shutil.copy2(src_path, dst_path)
-                        
-                        progress = 10 + (i / len(xml_files) * 20)
-                        self.update_progress(progress, f"Preparando arquivo {i+1} de {len(xml_files)}...")
-                
-                # Executa o processamento
-                self.update_progress(30, "Processando arquivos XML...")
-                
-                # Chama a função principal do módulo
-                easyxml.main()
-                
-                self.update_progress(100, "Processamento concluído com sucesso!")
-                messagebox.showinfo("Sucesso", "Processamento concluído com sucesso!")
-                
-            except Exception as e:
-                logging.error(f"Erro durante o processamento: {str(e)}")
-                logging.error(traceback.format_exc())
-                self.update_progress(0, f"Erro: {str(e)}")
-                messagebox.showerror("Erro", f"Ocorreu um erro durante o processamento: {str(e)}")
+        if self.execucao.em_andamento():
+            messagebox.showinfo("Informação", "Já há um processamento em andamento.")
+            return
         
-        threading.Thread(target=process_thread).start()
+        # Inicia o processamento no processo de execucao.py, que só se comunica com a interface
+        # pela fila de eventos. A função principal do módulo lê os XMLs no próprio diretório de
+        # entrada e grava no diretório de saída escolhido
+        self.update_progress(0, f"Iniciando processamento de {len(xml_files)} arquivos XML...")
+        self.execucao.iniciar(formato=formato, entrada=input_dir, destino=output_dir)
+        self.set_running(True)
+        self.verificar_eventos()
+    
+    def cancel_processing(self):
+        # A leitura para na próxima verificação; o fim da execução chega como evento
+        self.execucao.cancelar()
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.update_progress(self.progress_var.get(), "Cancelando...")
+    
+    def close(self):
+        self.execucao.encerrar()
+        self.root.destroy()
 
 if __name__ == "__main__":
+    # No executável (PyInstaller), o processo de execucao.py é o próprio executável iniciado de
+    # novo: freeze_support o desvia para o processamento antes de abrir outra janela
+    multiprocessing.freeze_support()
+    
+    # Configuração de logging (gravado em uma thread à parte, ver registro.py)
+    log_file = f"easyxml_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+    registro.configurar(log_file, logging.INFO)
+    
     root = tk.Tk()
     app = EasyXMLApp(root)
     root.mainloop()
@@ -0,0 +1,100 @@
+import logging
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import progresso
+import registro
+
+# Execução de main() fora do processo da interface (ver easyxml_gui.py). O processamento roda em
+# um processo próprio, que não disputa o GIL com o laço de eventos do Tk, e fica aberto entre
+# uma execução e outra: as importações (pandas, backend de XML...) só são feitas uma vez, ao
+# abrir a interface.
+#
+# O processo recebe na criação a fila de eventos, o sinal de cancelamento e a fila do log
+# (ver registro.py). Cada execução publica o progresso na fila de eventos (ver progresso.py) e
+# termina com um evento ETAPA_FIM, sempre o último da execução na fila. Com o cancelamento
+# marcado, main() para na próxima verificação da leitura, descarta o arquivo de saída e mantém
+# no cache os arquivos já lidos.
+#
+# Os processos são criados com "spawn" em todos os sistemas, como no Windows, em vez de copiar
+# (fork) o processo da interface com o Tk e as threads do log.
+
+_eventos = None
+_cancelamento = None
+
+def _iniciar_processo(eventos, cancelamento, fila_log, nivel_log):
+    global _eventos, _cancelamento
+    _eventos = eventos
+    _cancelamento = cancelamento
+    if fila_log is not None:
+        registro.iniciar_processo(fila_log, nivel_log)
+    # Importa o módulo principal e o que ele só carrega ao processar (pandas, planilha e saídas)
+    # já na criação do processo, antes da primeira execução
+    import main
+    import saidas
+    import tabela_notas
+
+def _aquecer():
+    pass
+
+def _executar(argumentos):
+    import main
+
+    erro = None
+    cancelado = False
+    try:
+        # main() retorna a mensagem do motivo quando não gera o arquivo (ex.: erro ao salvar)
+        erro = main.main(eventos=_eventos, cancelamento=_cancelamento, **argumentos)
+    except progresso.Cancelado:
+        cancelado = True
+    except Exception as e:
+        logging.error("Erro durante o processamento: %s", e)
+        logging.error(traceback.format_exc())
+        erro = str(e)
+    _eventos.put({"etapa": progresso.ETAPA_FIM, "erro": erro, "cancelado": cancelado})
+
+class Execucao:
+    def __init__(self):
+        self.contexto = multiprocessing.get_context("spawn")
+        self.eventos = self.contexto.Queue()
+        self.cancelamento = self.contexto.Event()
+        self.futuro = None
+        self._abrir()
+
+    def _abrir(self):
+        # Abre o processo já com o módulo principal importado
+        argumentos_log = registro.argumentos_processos().get("initargs", (None, logging.INFO))
+        self.executor = ProcessPoolExecutor(max_workers=1, mp_context=self.contexto, initializer=_iniciar_processo,
+                                            initargs=(self.eventos, self.cancelamento, *argumentos_log))
+        self.executor.submit(_aquecer)
+
+    def em_andamento(self):
+        return self.futuro is not None and not self.futuro.done()
+
+    def iniciar(self, **argumentos):
+        # Executa main(**argumentos) no processo; o progresso chega pela fila `eventos`
+        self.cancelamento.clear()
+        try:
+            self.futuro = self.executor.submit(_executar, argumentos)
+        except BrokenProcessPool:
+            # O processo terminou de forma inesperada em uma execução anterior: abre outro
+            self.executor.shutdown(wait=False)
+            self._abrir()
+            self.futuro = self.executor.submit(_executar, argumentos)
+        return self.futuro
+
+    def falha(self):
+        # Erro da execução que não chegou como evento (o processo terminou de forma inesperada)
+        if self.futuro is None or not self.futuro.done() or self.futuro.cancelled():
+            return None
+        return self.futuro.exception()
+
+    def cancelar(self):
+        self.cancelamento.set()
+
+    def encerrar(self):
+        # Cancela a execução em andamento e fecha o processo quando ela terminar
+        self.cancelamento.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,977 @@
+import pandas as pd
+
+import moeda
+from acumuladores import ContagemDistintos, EsbocoQuantis, Resumo, hashes
+from agregacoes import Agregacoes
+
+# Cálculo dos indicadores da planilha, separado da gravação (ver planilha.py). Os valores em
+# reais chegam em centavos inteiros e são formatados aqui mesmo, como texto ("R$ 1.234,56").
+#
+# O painel da aba "Indicadores" é uma lista de linhas, na ordem em que são gravadas; None é uma
+# linha em branco e as demais são tuplas que começam pelo tipo da linha:
+#   ("titulo", texto)                      título do painel
+#   ("secao", texto)                       título de seção
+#   ("cabecalhos", a, b, c)                cabeçalho das listas de indicadores
+#   ("indicador", indicador, valor, obs, i)
+#   ("subtitulo", texto)                   título de uma tabela dentro da seção
+#   ("cabecalhos_tabela", a, b, c)
+#   ("linha_tabela", a, b, c, i)
+# `i` é a posição da linha na sua lista, para alternar a cor de fundo.
+
+def adicionar_titulo_secao(painel, texto):
+    painel.append(("secao", texto))
+
+def adicionar_cabecalhos(painel):
+    painel.append(("cabecalhos", "Indicador", "Valor", "Observação"))
+
+def adicionar_indicador(painel, indicador, valor, obs, i):
+    painel.append(("indicador", indicador, valor, obs, i))
+
+def adicionar_subtitulo(painel, texto):
+    painel.append(("subtitulo", texto))
+
+def adicionar_cabecalhos_tabela(painel, a, b, c):
+    painel.append(("cabecalhos_tabela", a, b, c))
+
+def adicionar_linha_tabela(painel, a, b, c, i):
+    painel.append(("linha_tabela", a, b, c, i))
+
+def _ou_na(valor, formato=None):
+    # Indicadores que não puderam ser calculados (None) aparecem como "N/A"
+    if valor is None:
+        return "N/A"
+    return formato.format(valor) if formato else valor
+
+def _estimado(agregados, dimensao, valor, texto=None):
+    # Indicadores lidos dos maiores guardados de uma dimensão aproximada (ver agregacoes.py) ficam
+    # abaixo dos verdadeiros e são marcados como estimativa. Um valor zerado só quer dizer que ele
+    # não ficou guardado, e não que não houve notas, e aparece como "N/A". Com a dimensão exata,
+    # `texto` (ou o próprio valor) sai sem mudança
+    texto = valor if texto is None else texto
+    if not agregados.aproximado(dimensao):
+        return texto
+    if valor is None or valor == 0 or valor == "N/A":
+        return "N/A"
+    return f"{texto} (estimativa)"
+
+# Colunas em reais resumidas nos indicadores (total, média, máximo e mínimo)
+COLUNAS_MOEDA_INDICADORES = ["Base de Cálculo", "Valor ISS", "Valor Líquido"]
+# Dimensões agrupadas nos indicadores (ver agregacoes.py)
+DIMENSOES_INDICADORES = ["Tomador", "Prestador", "Item Lista Serviço", "Município Prestador", "UF Prestador"]
+# Colunas "Sim"/"Não" em que se contam as notas com "Sim"
+COLUNAS_SIM_NAO = ["ISS Retido", "Optante Simples Nacional"]
+# Dimensões contadas também de forma aproximada (ver ContagemDistintos), no total e por mês de
+# competência, pela coluna do documento (sem ela, pelo nome). A contagem exata e as demais seções
+# do painel agrupam pelo nome; a aproximada só é usada quando a dimensão deixa de ser exata
+IDENTIFICADORES_DISTINTOS = {"Tomador": "CNPJ/CPF Tomador", "Prestador": "CNPJ Prestador"}
+
+class AcumuladorIndicadores:
+    # Recebe as notas em lotes (DataFrames com as colunas da tabela, valores em reais em centavos)
+    # por adicionar(df_lote) e guarda só o necessário para os indicadores: somas, contagens,
+    # mínimos e máximos, a variância e a mediana da base de cálculo (ver acumuladores.py) e os
+    # agrupamentos por dimensão (ver agregacoes.py). O espaço ocupado não depende da quantidade
+    # de notas, só da de tomadores, serviços, municípios etc. distintos. Tomadores e prestadores
+    # distintos também são contados por CNPJ/CPF em ContagemDistintos, no total (`distintos`) e
+    # por competência (`distintos_por_mes`, {"MM/AAAA": contagem}), combinadas por ano no painel.
+    # As contagens valem só para a execução: as notas do cache também passam por adicionar
+    def __init__(self):
+        self.total_notas = 0
+        self.colunas = []
+        self.resumos = {coluna: Resumo() for coluna in COLUNAS_MOEDA_INDICADORES + ["Alíquota (%)"]}
+        self.mediana_base_calculo = EsbocoQuantis()
+        self.primeira_data = None
+        self.ultima_data = None
+        self.notas_sim = dict.fromkeys(COLUNAS_SIM_NAO, 0)
+        self.agregados = Agregacoes(DIMENSOES_INDICADORES, "Base de Cálculo")
+        self.distintos = {dimensao: ContagemDistintos() for dimensao in IDENTIFICADORES_DISTINTOS}
+        self.distintos_por_mes = {dimensao: {} for dimensao in IDENTIFICADORES_DISTINTOS}
+
+    def adicionar(self, df_lote):
+        self.total_notas += len(df_lote)
+        self.colunas += [coluna for coluna in df_lote.columns if coluna not in self.colunas]
+        for coluna, resumo in self.resumos.items():
+            if coluna in df_lote.columns:
+                resumo.adicionar(df_lote[coluna])
+        if "Base de Cálculo" in df_lote.columns:
+            self.mediana_base_calculo.adicionar(df_lote["Base de Cálculo"])
+        if "Data Emissão" in df_lote.columns:
+            datas = pd.to_datetime(df_lote["Data Emissão"], errors='coerce')
+            primeira, ultima = datas.min(), datas.max()
+            if pd.notna(primeira):
+                self.primeira_data = primeira if self.primeira_data is None else min(self.primeira_data, primeira)
+                self.ultima_data = ultima if self.ultima_data is None else max(self.ultima_data, ultima)
+        for coluna in self.notas_sim:
+            if coluna in df_lote.columns:
+                self.notas_sim[coluna] += int((df_lote[coluna] == "Sim").sum())
+        self.agregados.adicionar(df_lote)
+        for dimensao in IDENTIFICADORES_DISTINTOS:
+            self._contar_distintos(df_lote, dimensao, self.chave_distintos(dimensao))
+
+    def chave_distintos(self, dimensao):
+        # Coluna pela qual tomadores e prestadores distintos são contados: o documento, se as
+        # notas o têm, ou o nome
+        coluna = IDENTIFICADORES_DISTINTOS[dimensao]
+        return coluna if coluna in self.colunas else dimensao
+
+    def _contar_distintos(self, df_lote, dimensao, coluna):
+        if coluna not in df_lote.columns:
+            return
+        validos = (df_lote[coluna].notna() & (df_lote[coluna] != "Não informado")).to_numpy()
+        # O hash de cada nota é calculado uma vez e vai para o total e para o mês da nota
+        valores = hashes(df_lote[coluna][validos])
+        self.distintos[dimensao].adicionar_hashes(valores)
+        if "Competência" not in df_lote.columns:
+            return
+        meses = df_lote["Competência"].to_numpy()[validos]
+        for mes in pd.unique(meses):
+            if pd.notna(mes):
+                contagem = self.distintos_por_mes[dimensao].setdefault(mes, ContagemDistintos())
+                contagem.adicionar_hashes(valores[meses == mes])
+
+    def distintos_por_ano(self, dimensao):
+        # {ano: contagem} combinando as contagens dos meses de cada ano
+        por_ano = {}
+        for mes, contagem in self.distintos_por_mes[dimensao].items():
+            por_ano.setdefault(mes[-4:], ContagemDistintos()).combinar(contagem)
+        return por_ano
+
+    def calcular(self, coluna_total_notas=None):
+        return _calcular(self, coluna_total_notas)
+
+def _distintos(acumulador, dimensao):
+    # Valores diferentes da dimensão: exato pelos agrupamentos (pelo nome, como nas demais seções)
+    # ou, se a dimensão passou a ser aproximada (ver agregacoes.py), estimado pela
+    # ContagemDistintos (pelo documento, ver chave_distintos); None se não houver como
+    quantidade = acumulador.agregados.distintos(dimensao)
+    if quantidade is None and dimensao in acumulador.distintos:
+        quantidade = acumulador.distintos[dimensao].estimativa()
+    return quantidade
+
+def _descricao_chave(acumulador, dimensao):
+    # Coluna pela qual a ContagemDistintos conta a dimensão, para as observações do painel
+    chave = acumulador.chave_distintos(dimensao)
+    return f"pelo {chave}" if chave != dimensao else "pelo nome"
+
+def _descricao_distintos(acumulador, dimensao):
+    # Como _distintos obteve a quantidade da dimensão
+    if acumulador.agregados.aproximado(dimensao) and dimensao in acumulador.distintos:
+        return f"estimativa {_descricao_chave(acumulador, dimensao)}"
+    return "pelo nome"
+
+def calcular_indicadores(df_notas, coluna_total_notas=None):
+    # Indicadores de um DataFrame com todas as notas (ver AcumuladorIndicadores.calcular)
+    acumulador = AcumuladorIndicadores()
+    acumulador.adicionar(df_notas)
+    return acumulador.calcular(coluna_total_notas)
+
+def _calcular(acumulador, coluna_total_notas):
+    # Retorna os totais da primeira linha da aba "Notas Fiscais" ({coluna: texto}) e o painel
+    # da aba "Indicadores", a partir do que foi acumulado. O total de notas fica na
+    # `coluna_total_notas` (por padrão, a primeira coluna)
+    colunas = acumulador.colunas
+    resumos = acumulador.resumos
+
+    # Quantidade, soma, mínimo e máximo da base de cálculo por tomador, município, UF, serviço
+    # etc., agrupados uma vez e lidos por todas as seções
+    agregados = acumulador.agregados
+
+    # Calcula os indicadores
+    total_notas = acumulador.total_notas
+
+    # Calcula os totais das colunas monetárias
+    total_base_calculo = resumos["Base de Cálculo"].soma
+    total_valor_iss = resumos["Valor ISS"].soma
+    total_valor_liquido = resumos["Valor Líquido"].soma
+
+    # Valores monetários (em centavos) no padrão brasileiro: "R$ 1.234,56"
+    formatar_valor_br = moeda.formatar_reais
+
+    # Indicadores da primeira linha da planilha, acima do cabeçalho
+    totais = {coluna_total_notas or colunas[0]: f"Total de Notas: {total_notas}"}
+    if "Base de Cálculo" in colunas:
+        totais["Base de Cálculo"] = f"Total Base de Cálculo: {formatar_valor_br(total_base_calculo)}"
+    if "Valor ISS" in colunas:
+        totais["Valor ISS"] = f"Total Valor ISS: {formatar_valor_br(total_valor_iss)}"
+    if "Valor Líquido" in colunas:
+        totais["Valor Líquido"] = f"Total Valor Líquido: {formatar_valor_br(total_valor_liquido)}"
+
+    # Calcula indicadores básicos
+    media_base_calculo = total_base_calculo / total_notas if total_notas > 0 else 0
+    media_valor_iss = total_valor_iss / total_notas if total_notas > 0 else 0
+    media_valor_liquido = total_valor_liquido / total_notas if total_notas > 0 else 0
+
+    # Calcula valores máximos e mínimos (sem valores, ficam vazios e aparecem como zero)
+    max_base_calculo = resumos["Base de Cálculo"].maximo
+    min_base_calculo = resumos["Base de Cálculo"].minimo
+    max_valor_iss = resumos["Valor ISS"].maximo
+    min_valor_iss = resumos["Valor ISS"].minimo
+    max_valor_liquido = resumos["Valor Líquido"].maximo
+    min_valor_liquido = resumos["Valor Líquido"].minimo
+
+    # Calcula desvio padrão e mediana
+    desvio_padrao_base_calculo = resumos["Base de Cálculo"].desvio_padrao()
+    mediana_base_calculo = acumulador.mediana_base_calculo.mediana()
+
+    # Calcula indicadores temporais
+    primeira_nota_data = acumulador.primeira_data
+    ultima_nota_data = acumulador.ultima_data
+
+    # Calcula período em dias
+    periodo_dias = (ultima_nota_data - primeira_nota_data).days + 1 if primeira_nota_data and ultima_nota_data else 0
+    media_notas_por_dia = total_notas / periodo_dias if periodo_dias > 0 else 0
+
+    # Calcula indicadores por tomador de serviço
+    total_clientes_unicos = _distintos(acumulador, "Tomador") if "Tomador" in colunas else 0
+
+    # Tomador com maior volume financeiro
+    if "Tomador" in colunas and "Base de Cálculo" in colunas:
+        # Tomadores pela soma dos valores
+        clientes_por_valor = agregados.ranking("Tomador", "soma")
+
+        if not clientes_por_valor.empty:
+            cliente_maior_valor = clientes_por_valor.index[0]
+            valor_maior_cliente = clientes_por_valor.iloc[0]
+
+            # Top 5 clientes por valor
+            top5_clientes = clientes_por_valor.head(5)
+            top5_clientes_nomes = list(top5_clientes.index)
+            top5_clientes_valores = list(top5_clientes.values)
+
+            # Concentração do faturamento entre os tomadores (ver concentracao.py)
+            concentracao_clientes = agregados.concentracao("Tomador", total_base_calculo)
+
+            # Calcula quantos clientes representam 80% do faturamento. Essas medidas dependem de
+            # todos os tomadores e ficam de fora (None) se só os maiores forem guardados
+            if agregados.aproximado("Tomador"):
+                clientes_80_porcento = indice_gini = hhi_clientes = None
+            else:
+                clientes_80_porcento = concentracao_clientes.quantidade_para(0.8)
+                indice_gini = concentracao_clientes.gini()
+                hhi_clientes = concentracao_clientes.hhi()
+        else:
+            cliente_maior_valor = "N/A"
+            valor_maior_cliente = 0
+            top5_clientes_nomes = ["N/A"] * 5
+            top5_clientes_valores = [0] * 5
+            clientes_80_porcento = 0
+            indice_gini = 0
+            hhi_clientes = 0
+
+        # Tomador com maior quantidade de notas
+        clientes_por_qtd = agregados.ranking("Tomador", "quantidade")
+
+        if not clientes_por_qtd.empty:
+            cliente_maior_qtd = clientes_por_qtd.index[0]
+            qtd_maior_cliente = clientes_por_qtd.iloc[0]
+
+            # Top 5 clientes por quantidade
+            top5_clientes_qtd = clientes_por_qtd.head(5)
+            top5_clientes_qtd_nomes = list(top5_clientes_qtd.index)
+            top5_clientes_qtd_valores = list(top5_clientes_qtd.values)
+        else:
+            cliente_maior_qtd = "N/A"
+            qtd_maior_cliente = 0
+            top5_clientes_qtd_nomes = ["N/A"] * 5
+            top5_clientes_qtd_valores = [0] * 5
+
+        # Concentração de faturamento (top 5 clientes)
+        if not clientes_por_valor.empty:
+            concentracao_top5 = concentracao_clientes.participacao_top(5)
+        else:
+            concentracao_top5 = 0
+    else:
+        cliente_maior_valor = "N/A"
+        valor_maior_cliente = 0
+        top5_clientes_nomes = ["N/A"] * 5
+        top5_clientes_valores = [0] * 5
+        cliente_maior_qtd = "N/A"
+        qtd_maior_cliente = 0
+        top5_clientes_qtd_nomes = ["N/A"] * 5
+        top5_clientes_qtd_valores = [0] * 5
+        concentracao_top5 = 0
+        clientes_80_porcento = 0
+        indice_gini = 0
+        hhi_clientes = 0
+
+    # Calcula indicadores fiscais e tributários
+    if "Alíquota (%)" in colunas:
+        aliquota = resumos["Alíquota (%)"]
+        aliquota_media = aliquota.soma / aliquota.quantidade if aliquota.quantidade else float("nan")
+    else:
+        aliquota_media = 0
+
+    # Percentual de notas com ISS retido
+    if "ISS Retido" in colunas:
+        notas_iss_retido = acumulador.notas_sim["ISS Retido"]
+        percentual_iss_retido = (notas_iss_retido / total_notas) * 100 if total_notas > 0 else 0
+    else:
+        notas_iss_retido = 0
+        percentual_iss_retido = 0
+
+    # Percentual de notas para optantes do Simples Nacional
+    if "Optante Simples Nacional" in colunas:
+        notas_simples = acumulador.notas_sim["Optante Simples Nacional"]
+        percentual_simples = (notas_simples / total_notas) * 100 if total_notas > 0 else 0
+    else:
+        notas_simples = 0
+        percentual_simples = 0
+
+    # Calcula indicadores de serviços
+    if "Item Lista Serviço" in colunas:
+        # Serviços mais prestados
+        servicos_mais_prestados = agregados.ranking("Item Lista Serviço", "quantidade")
+
+        if not servicos_mais_prestados.empty:
+            servico_mais_comum = servicos_mais_prestados.index[0]
+            qtd_servico_mais_comum = servicos_mais_prestados.iloc[0]
+        else:
+            servico_mais_comum = "N/A"
+            qtd_servico_mais_comum = 0
+    else:
+        servico_mais_comum = "N/A"
+        qtd_servico_mais_comum = 0
+
+    # Calcula indicadores geográficos
+    if "Município Prestador" in colunas:
+        # Distribuição por município
+        municipios = agregados.ranking("Município Prestador", "quantidade")
+
+        if not municipios.empty:
+            municipio_mais_comum = municipios.index[0]
+            qtd_municipio_mais_comum = municipios.iloc[0]
+
+            # Top 5 municípios por quantidade
+            top5_municipios = municipios.head(5)
+            top5_municipios_nomes = list(top5_municipios.index)
+            top5_municipios_valores = list(top5_municipios.values)
+
+            # Calcula valor por município
+            if "Base de Cálculo" in colunas:
+                municipios_por_valor = agregados.ranking("Município Prestador", "soma")
+
+                if not municipios_por_valor.empty:
+                    municipio_maior_valor = municipios_por_valor.index[0]
+                    valor_municipio_maior = municipios_por_valor.iloc[0]
+
+                    # Top 5 municípios por valor
+                    top5_municipios_valor = municipios_por_valor.head(5)
+                    top5_municipios_valor_nomes = list(top5_municipios_valor.index)
+                    top5_municipios_valor_valores = list(top5_municipios_valor.values)
+
+                    # Concentração por município (percentual do top 5)
+                    concentracao_top5_municipios = agregados.concentracao("Município Prestador", total_base_calculo).participacao_top(5)
+                else:
+                    municipio_maior_valor = "N/A"
+                    valor_municipio_maior = 0
+                    top5_municipios_valor_nomes = ["N/A"] * 5
+                    top5_municipios_valor_valores = [0] * 5
+                    concentracao_top5_municipios = 0
+            else:
+                municipio_maior_valor = "N/A"
+                valor_municipio_maior = 0
+                top5_municipios_valor_nomes = ["N/A"] * 5
+                top5_municipios_valor_valores = [0] * 5
+                concentracao_top5_municipios = 0
+        else:
+            municipio_mais_comum = "N/A"
+            qtd_municipio_mais_comum = 0
+            top5_municipios_nomes = ["N/A"] * 5
+            top5_municipios_valores = [0] * 5
+            municipio_maior_valor = "N/A"
+            valor_municipio_maior = 0
+            top5_municipios_valor_nomes = ["N/A"] * 5
+            top5_municipios_valor_valores = [0] * 5
+            concentracao_top5_municipios = 0
+    else:
+        municipio_mais_comum = "N/A"
+        qtd_municipio_mais_comum = 0
+        top5_municipios_nomes = ["N/A"] * 5
+        top5_municipios_valores = [0] * 5
+        municipio_maior_valor = "N/A"
+        valor_municipio_maior = 0
+        top5_municipios_valor_nomes = ["N/A"] * 5
+        top5_municipios_valor_valores = [0] * 5
+        concentracao_top5_municipios = 0
+
+    if "UF Prestador" in colunas:
+        # Distribuição por UF
+        ufs = agregados.ranking("UF Prestador", "quantidade")
+
+        if not ufs.empty:
+            uf_mais_comum = ufs.index[0]
+            qtd_uf_mais_comum = ufs.iloc[0]
+
+            # Top 5 UFs por quantidade
+            top5_ufs = ufs.head(min(5, len(ufs)))
+            top5_ufs_nomes = list(top5_ufs.index)
+            top5_ufs_valores = list(top5_ufs.values)
+
+            # Calcula valor por UF
+            if "Base de Cálculo" in colunas:
+                ufs_por_valor = agregados.ranking("UF Prestador", "soma")
+
+                if not ufs_por_valor.empty:
+                    uf_maior_valor = ufs_por_valor.index[0]
+                    valor_uf_maior = ufs_por_valor.iloc[0]
+
+                    # Top 5 UFs por valor (ou menos se houver menos de 5 UFs)
+                    top5_ufs_valor = ufs_por_valor.head(min(5, len(ufs_por_valor)))
+                    top5_ufs_valor_nomes = list(top5_ufs_valor.index)
+                    top5_ufs_valor_valores = list(top5_ufs_valor.values)
+
+                    # Valor médio por UF
+                    valor_medio_por_uf = total_base_calculo / len(ufs_por_valor) if len(ufs_por_valor) > 0 else 0
+                else:
+                    uf_maior_valor = "N/A"
+                    valor_uf_maior = 0
+                    top5_ufs_valor_nomes = ["N/A"] * min(5, len(ufs))
+                    top5_ufs_valor_valores = [0] * min(5, len(ufs))
+                    valor_medio_por_uf = 0
+            else:
+                uf_maior_valor = "N/A"
+                valor_uf_maior = 0
+                top5_ufs_valor_nomes = ["N/A"] * min(5, len(ufs))
+                top5_ufs_valor_valores = [0] * min(5, len(ufs))
+                valor_medio_por_uf = 0
+        else:
+            uf_mais_comum = "N/A"
+            qtd_uf_mais_comum = 0
+            top5_ufs_nomes = ["N/A"] * 5
+            top5_ufs_valores = [0] * 5
+            uf_maior_valor = "N/A"
+            valor_uf_maior = 0
+            top5_ufs_valor_nomes = ["N/A"] * 5
+            top5_ufs_valor_valores = [0] * 5
+            valor_medio_por_uf = 0
+    else:
+        uf_mais_comum = "N/A"
+        qtd_uf_mais_comum = 0
+        top5_ufs_nomes = ["N/A"] * 5
+        top5_ufs_valores = [0] * 5
+        uf_maior_valor = "N/A"
+        valor_uf_maior = 0
+        top5_ufs_valor_nomes = ["N/A"] * 5
+        top5_ufs_valor_valores = [0] * 5
+        valor_medio_por_uf = 0
+
+    # Painel da aba "Indicadores": o título e uma linha em branco antes das seções
+    painel = [("titulo", "PAINEL DE INDICADORES"), None]
+
+    # Seção 1: Indicadores Gerais
+    adicionar_titulo_secao(painel, "1. INDICADORES GERAIS")
+    adicionar_cabecalhos(painel)
+
+    indicadores_gerais = [
+        ("Total de Notas Fiscais", total_notas, "Quantidade total de notas processadas"),
+        ("Total Base de Cálculo", formatar_valor_br(total_base_calculo), "Soma de todas as bases de cálculo"),
+        ("Total Valor ISS", formatar_valor_br(total_valor_iss), "Soma de todos os valores de ISS"),
+        ("Total Valor Líquido", formatar_valor_br(total_valor_liquido), "Soma de todos os valores líquidos"),
+        ("Média Base de Cálculo", formatar_valor_br(media_base_calculo), "Valor médio da base de cálculo por nota"),
+        ("Média Valor ISS", formatar_valor_br(media_valor_iss), "Valor médio do ISS por nota"),
+        ("Média Valor Líquido", formatar_valor_br(media_valor_liquido), "Valor médio líquido por nota"),
+        ("Desvio Padrão Base de Cálculo", formatar_valor_br(desvio_padrao_base_calculo), "Medida de dispersão dos valores"),
+        ("Mediana Base de Cálculo", formatar_valor_br(mediana_base_calculo), "Valor central (50% acima, 50% abaixo)"),
+        ("Máximo Base de Cálculo", formatar_valor_br(max_base_calculo), "Maior valor de base de cálculo"),
+        ("Mínimo Base de Cálculo", formatar_valor_br(min_base_calculo), "Menor valor de base de cálculo"),
+        ("Máximo Valor ISS", formatar_valor_br(max_valor_iss), "Maior valor de ISS"),
+        ("Mínimo Valor ISS", formatar_valor_br(min_valor_iss), "Menor valor de ISS"),
+        ("Máximo Valor Líquido", formatar_valor_br(max_valor_liquido), "Maior valor líquido"),
+        ("Mínimo Valor Líquido", formatar_valor_br(min_valor_liquido), "Menor valor líquido"),
+    ]
+
+    for i, (indicador, valor, obs) in enumerate(indicadores_gerais):
+        adicionar_indicador(painel, indicador, valor, obs, i)
+
+    # Adiciona espaço entre seções
+    painel.append(None)
+
+    # Seção 2: Indicadores Temporais
+    adicionar_titulo_secao(painel, "2. INDICADORES TEMPORAIS")
+    adicionar_cabecalhos(painel)
+
+    # Formata datas para exibição
+    primeira_nota_str = primeira_nota_data.strftime('%d/%m/%Y') if primeira_nota_data else "N/A"
+    ultima_nota_str = ultima_nota_data.strftime('%d/%m/%Y') if ultima_nota_data else "N/A"
+
+    indicadores_temporais = [
+        ("Período de Análise", f"{primeira_nota_str} a {ultima_nota_str}", "Intervalo entre a primeira e última nota"),
+        ("Duração do Período", f"{periodo_dias} dias", "Número de dias entre a primeira e última nota"),
+        ("Média de Notas por Dia", f"{media_notas_por_dia:.2f}", "Média diária de notas emitidas no período"),
+    ]
+
+    for i, (indicador, valor, obs) in enumerate(indicadores_temporais):
+        adicionar_indicador(painel, indicador, valor, obs, i)
+
+    # Adiciona espaço entre seções
+    painel.append(None)
+
+    # Seção 3: Análise de Tomadores e Prestadores
+    adicionar_titulo_secao(painel, "3. ANÁLISE DE TOMADORES E PRESTADORES")
+
+    # 3.1 Indicadores Gerais de Tomadores
+    adicionar_titulo_secao(painel, "3.1 Indicadores Gerais de Tomadores")
+    adicionar_cabecalhos(painel)
+
+    # Calcula a quantidade de prestadores únicos
+    total_prestadores_unicos = _distintos(acumulador, "Prestador") if "Prestador" in colunas else 0
+
+    if total_clientes_unicos is not None:
+        # Calcula o valor médio por tomador
+        valor_medio_por_tomador = formatar_valor_br(total_base_calculo / total_clientes_unicos if total_clientes_unicos > 0 else 0)
+
+        # Calcula a quantidade média de notas por tomador
+        notas_por_tomador = f"{total_notas / total_clientes_unicos if total_clientes_unicos > 0 else 0:.2f}"
+    else:
+        valor_medio_por_tomador = notas_por_tomador = "N/A"
+
+    # Calcula a relação tomador/prestador
+    if total_clientes_unicos is not None and total_prestadores_unicos is not None:
+        relacao_tomador_prestador = f"{total_clientes_unicos / total_prestadores_unicos if total_prestadores_unicos > 0 else 0:.2f}"
+    else:
+        relacao_tomador_prestador = "N/A"
+
+    indicadores_gerais_tomador = [
+        ("Quantidade de Tomadores Únicos", _ou_na(total_clientes_unicos),
+         f"Número total de tomadores de serviço diferentes, {_descricao_distintos(acumulador, 'Tomador')}"),
+        ("Valor Médio por Tomador", valor_medio_por_tomador, "Valor médio dos serviços prestados a cada tomador"),
+        ("Quantidade Média de Notas por Tomador", notas_por_tomador, "Média de notas fiscais emitidas para cada tomador"),
+        ("Relação Tomador/Prestador", relacao_tomador_prestador, "Quantidade de tomadores para cada prestador"),
+    ]
+
+    for i, (indicador, valor, obs) in enumerate(indicadores_gerais_tomador):
+        adicionar_indicador(painel, indicador, valor, obs, i)
+
+    # 3.2 Indicadores de Concentração
+    painel.append(None)
+    adicionar_titulo_secao(painel, "3.2 Indicadores de Concentração")
+    adicionar_cabecalhos(painel)
+
+    # Calcula o percentual do maior tomador
+    percentual_maior_tomador = (valor_maior_cliente / total_base_calculo) * 100 if total_base_calculo > 0 else 0
+
+    # Calcula a quantidade de notas emitidas para o tomador com maior volume
+    qtd_notas_maior_tomador = 0
+    if "Tomador" in colunas and cliente_maior_valor != "N/A":
+        qtd_notas_maior_tomador = agregados.quantidade("Tomador", cliente_maior_valor)
+
+    indicadores_concentracao = [
+        ("Tomador com Maior Volume", _estimado(agregados, "Tomador", cliente_maior_valor), "Tomador para o qual foi emitido maior valor em notas"),
+        ("Valor do Tomador com Maior Volume", _estimado(agregados, "Tomador", valor_maior_cliente, formatar_valor_br(valor_maior_cliente)),
+         "Valor total dos serviços prestados ao tomador de maior volume"),
+        ("Quantidade de Notas do Tomador com Maior Volume", _estimado(agregados, "Tomador", qtd_notas_maior_tomador),
+         "Número de notas emitidas para o tomador com maior volume"),
+        ("Percentual do Maior Tomador", _estimado(agregados, "Tomador", percentual_maior_tomador, f"{percentual_maior_tomador:.2f}%"),
+         "Percentual do faturamento representado pelo maior tomador"),
+        ("Concentração Top 5 Tomadores", _estimado(agregados, "Tomador", concentracao_top5, f"{concentracao_top5:.2f}%"),
+         "Percentual do faturamento dos 5 maiores tomadores"),
+        ("Tomadores para 80% do Faturamento", _ou_na(clientes_80_porcento), "Quantidade de tomadores que representam 80% do faturamento"),
+        ("Índice de Concentração (Gini)", _ou_na(indice_gini, "{:.4f}"), "Medida de desigualdade (0=igualdade perfeita, 1=concentração total)"),
+        ("Índice Herfindahl-Hirschman (HHI)", _ou_na(hhi_clientes, "{:.0f}"), "Soma dos quadrados das participações dos tomadores (até 10.000 = um só tomador)"),
+    ]
+
+    for i, (indicador, valor, obs) in enumerate(indicadores_concentracao):
+        adicionar_indicador(painel, indicador, valor, obs, i)
+
+    # 3.3 Indicadores de Frequência
+    painel.append(None)
+    adicionar_titulo_secao(painel, "3.3 Indicadores de Frequência")
+    adicionar_cabecalhos(painel)
+
+    # Calcula tomadores por frequência de notas (precisa de todos os tomadores)
+    if "Tomador" in colunas and not agregados.aproximado("Tomador"):
+        # Contagem de notas por tomador
+        notas_por_tomador_qtd = agregados.por("Tomador")["quantidade"]
+
+        # Tomadores com apenas 1 nota
+        tomadores_1_nota = int((notas_por_tomador_qtd == 1).sum())
+        percentual_tomadores_1_nota = (tomadores_1_nota / total_clientes_unicos) * 100 if total_clientes_unicos > 0 else 0
+
+        # Tomadores com 2 a 5 notas
+        tomadores_2_5_notas = int(notas_por_tomador_qtd.between(2, 5).sum())
+        percentual_tomadores_2_5_notas = (tomadores_2_5_notas / total_clientes_unicos) * 100 if total_clientes_unicos > 0 else 0
+
+        # Tomadores com mais de 5 notas
+        tomadores_mais_5_notas = int((notas_por_tomador_qtd > 5).sum())
+        percentual_tomadores_mais_5_notas = (tomadores_mais_5_notas / total_clientes_unicos) * 100 if total_clientes_unicos > 0 else 0
+
+        faixas_frequencia = [f"{tomadores_1_nota} ({percentual_tomadores_1_nota:.2f}%)",
+                             f"{tomadores_2_5_notas} ({percentual_tomadores_2_5_notas:.2f}%)",
+                             f"{tomadores_mais_5_notas} ({percentual_tomadores_mais_5_notas:.2f}%)"]
+    elif "Tomador" in colunas:
+        faixas_frequencia = ["N/A"] * 3
+    else:
+        faixas_frequencia = ["0 (0.00%)"] * 3
+
+    indicadores_frequencia = [
+        ("Tomador com Maior Quantidade", _estimado(agregados, "Tomador", cliente_maior_qtd), "Tomador para o qual foram emitidas mais notas fiscais"),
+        ("Quantidade de Notas do Tomador", _estimado(agregados, "Tomador", qtd_maior_cliente),
+         "Número de notas emitidas para o tomador com maior quantidade"),
+        ("Tomadores com Apenas 1 Nota", faixas_frequencia[0], "Quantidade e percentual de tomadores para os quais foi emitida apenas 1 nota"),
+        ("Tomadores com 2 a 5 Notas", faixas_frequencia[1], "Quantidade e percentual de tomadores para os quais foram emitidas de 2 a 5 notas"),
+        ("Tomadores com Mais de 5 Notas", faixas_frequencia[2], "Quantidade e percentual de tomadores para os quais foram emitidas mais de 5 notas"),
+    ]
+
+    for i, (indicador, valor, obs) in enumerate(indicadores_frequencia):
+        adicionar_indicador(painel, indicador, valor, obs, i)
+
+    # 3.4 Indicadores de Valor por Nota
+    painel.append(None)
+    adicionar_titulo_secao(painel, "3.4 Indicadores de Valor por Nota")
+    adicionar_cabecalhos(painel)
+
+    # Calcula o valor médio por nota para cada tomador (precisa de todos os tomadores)
+    if "Tomador" in colunas and "Base de Cálculo" in colunas and not agregados.aproximado("Tomador"):
+        # Calcula o valor médio por nota para cada tomador
+        por_tomador = agregados.por("Tomador")
+        valor_medio_por_nota = por_tomador["soma"] / por_tomador["quantidade"]
+
+        # Encontra o tomador com maior valor médio por nota
+        if not valor_medio_por_nota.empty:
+            tomador_maior_valor_medio = valor_medio_por_nota.idxmax()
+            valor_medio_maior = valor_medio_por_nota.max()
+
+            # Encontra o tomador com menor valor médio por nota
+            tomador_menor_valor_medio = valor_medio_por_nota.idxmin()
+            valor_medio_menor = valor_medio_por_nota.min()
+
+            # Calcula o desvio padrão dos valores médios
+            desvio_padrao_valores_medios = valor_medio_por_nota.std()
+        else:
+            tomador_maior_valor_medio = "N/A"
+            valor_medio_maior = 0
+            tomador_menor_valor_medio = "N/A"
+            valor_medio_menor = 0
+            desvio_padrao_valores_medios = 0
+    else:
+        tomador_maior_valor_medio = "N/A"
+        valor_medio_maior = 0
+        tomador_menor_valor_medio = "N/A"
+        valor_medio_menor = 0
+        desvio_padrao_valores_medios = 0
+
+    indicadores_valor_nota = [
+        ("Tomador com Maior Valor Médio por Nota", tomador_maior_valor_medio, "Tomador com maior valor médio por nota fiscal"),
+        ("Valor Médio por Nota", formatar_valor_br(valor_medio_maior), "Valor médio por nota do tomador com maior média"),
+        ("Tomador com Menor Valor Médio por Nota", tomador_menor_valor_medio, "Tomador com menor valor médio por nota fiscal"),
+        ("Valor Médio por Nota", formatar_valor_br(valor_medio_menor), "Valor médio por nota do tomador com menor média"),
+        ("Desvio Padrão dos Valores Médios", formatar_valor_br(desvio_padrao_valores_medios), "Variação dos valores médios entre tomadores"),
+    ]
+
+    for i, (indicador, valor, obs) in enumerate(indicadores_valor_nota):
+        adicionar_indicador(painel, indicador, valor, obs, i)
+
+    # 3.5 Tabelas Detalhadas de Tomadores
+    painel.append(None)
+    adicionar_titulo_secao(painel, "3.5 Tabelas Detalhadas de Tomadores")
+
+    # Adiciona os top 5 tomadores por valor
+    if "Tomador" in colunas and "Base de Cálculo" in colunas:
+        # Adiciona subtítulo para os top 5 tomadores
+        painel.append(None)
+        adicionar_subtitulo(painel, "Top 5 Tomadores por Valor")
+
+        # Adiciona cabeçalhos para os top 5 tomadores
+        adicionar_cabecalhos_tabela(painel, "Tomador", "Valor Total", "% do Faturamento")
+
+        # Adiciona os top 5 tomadores
+        tomadores_por_valor = agregados.ranking("Tomador", "soma")
+        top5_tomadores = tomadores_por_valor.head(5)
+
+        for i, (tomador, valor) in enumerate(top5_tomadores.items()):
+            percentual = (valor / total_base_calculo) * 100 if total_base_calculo > 0 else 0
+
+            adicionar_linha_tabela(painel, tomador, _estimado(agregados, "Tomador", valor, formatar_valor_br(valor)),
+                                   _estimado(agregados, "Tomador", percentual, f"{percentual:.2f}%"), i)
+
+    # 3.6 Tomadores e prestadores distintos por ano de competência, das contagens de cada mês
+    tomadores_por_ano = acumulador.distintos_por_ano("Tomador")
+    prestadores_por_ano = acumulador.distintos_por_ano("Prestador")
+    anos = sorted(set(tomadores_por_ano) | set(prestadores_por_ano))
+    if anos:
+        painel.append(None)
+        adicionar_titulo_secao(painel, "3.6 Tomadores e Prestadores Distintos por Ano (estimativa)")
+        adicionar_cabecalhos_tabela(painel, "Ano de Competência", f"Tomadores Distintos ({_descricao_chave(acumulador, 'Tomador')})",
+                                    f"Prestadores Distintos ({_descricao_chave(acumulador, 'Prestador')})")
+
+        for i, ano in enumerate(anos):
+            tomadores_ano = tomadores_por_ano[ano].estimativa() if ano in tomadores_por_ano else 0
+            prestadores_ano = prestadores_por_ano[ano].estimativa() if ano in prestadores_por_ano else 0
+            adicionar_linha_tabela(painel, ano, tomadores_ano, prestadores_ano, i)
+
+    # Adiciona espaço entre seções
+    painel.append(None)
+
+    # Seção 4: Indicadores Fiscais e Tributários
+    adicionar_titulo_secao(painel, "4. INDICADORES FISCAIS E TRIBUTÁRIOS")
+    adicionar_cabecalhos(painel)
+
+    indicadores_fiscais = [
+        ("Alíquota Média de ISS", f"{aliquota_media:.2f}%", "Média das alíquotas aplicadas"),
+        ("Notas com ISS Retido", f"{notas_iss_retido} ({percentual_iss_retido:.2f}%)", "Quantidade e percentual de notas com ISS retido"),
+        ("Notas para Optantes do Simples", f"{notas_simples} ({percentual_simples:.2f}%)", "Quantidade e percentual de notas para optantes do Simples"),
+    ]
+
+    for i, (indicador, valor, obs) in enumerate(indicadores_fiscais):
+        adicionar_indicador(painel, indicador, valor, obs, i)
+
+    # Adiciona espaço entre seções
+    painel.append(None)
+
+    # Seção 5: Indicadores de Serviços
+    adicionar_titulo_secao(painel, "5. INDICADORES DE SERVIÇOS")
+
+    # 5.1 Indicadores Gerais de Serviços
+    adicionar_titulo_secao(painel, "5.1 Indicadores Gerais de Serviços")
+    adicionar_cabecalhos(painel)
+
+    # Calcula a quantidade de serviços únicos
+    total_servicos_unicos = _distintos(acumulador, "Item Lista Serviço") if "Item Lista Serviço" in colunas else 0
+
+    # Calcula o percentual do serviço mais comum
+    percentual_servico_mais_comum = (qtd_servico_mais_comum / total_notas) * 100 if total_notas > 0 else 0
+
+    indicadores_gerais_servicos = [
+        ("Serviço Mais Prestado", f"{servico_mais_comum} ({qtd_servico_mais_comum} notas)", "Código de serviço mais frequente"),
+        ("Percentual do Serviço Mais Prestado", f"{percentual_servico_mais_comum:.2f}%", "Percentual do serviço mais frequente em relação ao total de notas"),
+        ("Quantidade de Serviços Únicos", _ou_na(total_servicos_unicos), "Número total de códigos de serviço diferentes"),
+    ]
+
+    for i, (indicador, valor, obs) in enumerate(indicadores_gerais_servicos):
+        adicionar_indicador(painel, indicador, valor, obs, i)
+
+    # 5.2 Análise de Valor por Serviço
+    painel.append(None)
+    adicionar_titulo_secao(painel, "5.2 Análise de Valor por Serviço")
+    adicionar_cabecalhos(painel)
+
+    # Calcula o valor por serviço
+    if "Item Lista Serviço" in colunas and "Base de Cálculo" in colunas:
+        # Serviços pela soma dos valores
+        servicos_por_valor = agregados.ranking("Item Lista Serviço", "soma")
+
+        if not servicos_por_valor.empty:
+            # Serviço com maior valor total
+            servico_maior_valor = servicos_por_valor.index[0]
+            valor_maior_servico = servicos_por_valor.iloc[0]
+
+            # Percentual do serviço com maior valor
+            percentual_maior_servico = (valor_maior_servico / total_base_calculo) * 100 if total_base_calculo > 0 else 0
+
+            # Calcula a quantidade de notas do serviço com maior valor
+            qtd_notas_maior_servico = agregados.quantidade("Item Lista Serviço", servico_maior_valor)
+
+            # Calcula o valor médio por nota para o serviço com maior valor
+            valor_medio_por_nota_maior_servico = valor_maior_servico / qtd_notas_maior_servico if qtd_notas_maior_servico > 0 else 0
+
+            # Calcula a concentração dos top 5 serviços
+            concentracao_servicos = agregados.concentracao("Item Lista Serviço", total_base_calculo)
+            concentracao_top5_servicos = concentracao_servicos.participacao_top(5)
+            hhi_servicos = None if agregados.aproximado("Item Lista Serviço") else concentracao_servicos.hhi()
+        else:
+            servico_maior_valor = "N/A"
+            valor_maior_servico = 0
+            percentual_maior_servico = 0
+            qtd_notas_maior_servico = 0
+            valor_medio_por_nota_maior_servico = 0
+            concentracao_top5_servicos = 0
+            hhi_servicos = 0
+    else:
+        servico_maior_valor = "N/A"
+        valor_maior_servico = 0
+        percentual_maior_servico = 0
+        qtd_notas_maior_servico = 0
+        valor_medio_por_nota_maior_servico = 0
+        concentracao_top5_servicos = 0
+        hhi_servicos = 0
+
+    indicadores_valor_servico = [
+        ("Serviço com Maior Valor", servico_maior_valor, "Código de serviço com maior valor total"),
+        ("Valor Total do Serviço", formatar_valor_br(valor_maior_servico), "Valor total do serviço com maior valor"),
+        ("Percentual do Serviço com Maior Valor", f"{percentual_maior_servico:.2f}%", "Percentual do serviço com maior valor em relação ao total"),
+        ("Quantidade de Notas do Serviço", qtd_notas_maior_servico, "Número de notas do serviço com maior valor"),
+        ("Valor Médio por Nota", formatar_valor_br(valor_medio_por_nota_maior_servico), "Valor médio por nota do serviço com maior valor"),
+        ("Concentração Top 5 Serviços", f"{concentracao_top5_servicos:.2f}%", "Percentual do faturamento dos 5 serviços com maior valor"),
+        ("Índice Herfindahl-Hirschman (HHI)", _ou_na(hhi_servicos, "{:.0f}"), "Soma dos quadrados das participações dos serviços (até 10.000 = um só serviço)"),
+    ]
+
+    for i, (indicador, valor, obs) in enumerate(indicadores_valor_servico):
+        adicionar_indicador(painel, indicador, valor, obs, i)
+
+    # 5.3 Tabela de Serviços
+    painel.append(None)
+    adicionar_titulo_secao(painel, "5.3 Tabela de Serviços")
+
+    # Adiciona os top 5 serviços por valor
+    if "Item Lista Serviço" in colunas and "Base de Cálculo" in colunas:
+        # Adiciona subtítulo para os top 5 serviços
+        painel.append(None)
+        adicionar_subtitulo(painel, "Top 5 Serviços por Valor")
+
+        # Adiciona cabeçalhos para os top 5 serviços
+        adicionar_cabecalhos_tabela(painel, "Código de Serviço", "Valor Total", "% do Faturamento")
+
+        # Adiciona os top 5 serviços
+        top5_servicos = servicos_por_valor.head(5)
+
+        for i, (servico, valor) in enumerate(top5_servicos.items()):
+            percentual = (valor / total_base_calculo) * 100 if total_base_calculo > 0 else 0
+
+            adicionar_linha_tabela(painel, servico, formatar_valor_br(valor), f"{percentual:.2f}%", i)
+
+        # Adiciona subtítulo para os top 5 serviços por quantidade
+        painel.append(None)
+        adicionar_subtitulo(painel, "Top 5 Serviços por Quantidade de Notas")
+
+        # Adiciona cabeçalhos para os top 5 serviços por quantidade
+        adicionar_cabecalhos_tabela(painel, "Código de Serviço", "Quantidade de Notas", "% do Total")
+
+        # Adiciona os top 5 serviços por quantidade
+        top5_servicos_qtd = servicos_mais_prestados.head(5)
+
+        for i, (servico, qtd) in enumerate(top5_servicos_qtd.items()):
+            percentual = (qtd / total_notas) * 100 if total_notas > 0 else 0
+
+            adicionar_linha_tabela(painel, servico, qtd, f"{percentual:.2f}%", i)
+
+    # Adiciona espaço entre seções
+    painel.append(None)
+
+    # Seção 6: Indicadores Geográficos
+    adicionar_titulo_secao(painel, "6. INDICADORES GEOGRÁFICOS")
+
+    # 6.1 Indicadores Gerais Geográficos
+    adicionar_titulo_secao(painel, "6.1 Indicadores Gerais Geográficos")
+    adicionar_cabecalhos(painel)
+
+    # Calcula o município com maior valor
+    if "Município Prestador" in colunas and "Base de Cálculo" in colunas:
+        # Municípios pela soma dos valores
+        municipios_por_valor = agregados.ranking("Município Prestador", "soma")
+
+        if not municipios_por_valor.empty:
+            municipio_maior_valor = municipios_por_valor.index[0]
+            valor_municipio_maior = municipios_por_valor.iloc[0]
+            percentual_municipio_maior = (valor_municipio_maior / total_base_calculo) * 100 if total_base_calculo > 0 else 0
+            hhi_municipios = None if agregados.aproximado("Município Prestador") else agregados.concentracao("Município Prestador", total_base_calculo).hhi()
+        else:
+            municipio_maior_valor = "N/A"
+            valor_municipio_maior = 0
+            percentual_municipio_maior = 0
+            hhi_municipios = 0
+    else:
+        municipio_maior_valor = "N/A"
+        valor_municipio_maior = 0
+        percentual_municipio_maior = 0
+        hhi_municipios = 0
+
+    # Calcula a UF com maior valor
+    if "UF Prestador" in colunas and "Base de Cálculo" in colunas:
+        # UFs pela soma dos valores
+        ufs_por_valor = agregados.ranking("UF Prestador", "soma")
+
+        if not ufs_por_valor.empty:
+            uf_maior_valor = ufs_por_valor.index[0]
+            valor_uf_maior = ufs_por_valor.iloc[0]
+            percentual_uf_maior = (valor_uf_maior / total_base_calculo) * 100 if total_base_calculo > 0 else 0
+        else:
+            uf_maior_valor = "N/A"
+            valor_uf_maior = 0
+            percentual_uf_maior = 0
+    else:
+        uf_maior_valor = "N/A"
+        valor_uf_maior = 0
+        percentual_uf_maior = 0
+
+    indicadores_geograficos = [
+        ("Município Mais Frequente", municipio_mais_comum, "Município com maior número de notas"),
+        ("Quantidade de Notas no Município", qtd_municipio_mais_comum, "Número de notas no município mais frequente"),
+        ("Município com Maior Valor", municipio_maior_valor, "Município com maior valor total em notas"),
+        ("Valor Total do Município", formatar_valor_br(valor_municipio_maior), "Valor total das notas do município com maior valor"),
+        ("Percentual do Município", f"{percentual_municipio_maior:.2f}%", "Percentual do faturamento representado pelo município com maior valor"),
+        ("Índice Herfindahl-Hirschman (HHI)", _ou_na(hhi_municipios, "{:.0f}"), "Soma dos quadrados das participações dos municípios (até 10.000 = um só município)"),
+        ("UF Mais Frequente", uf_mais_comum, "Estado com maior número de notas"),
+        ("Quantidade de Notas na UF", qtd_uf_mais_comum, "Número de notas na UF mais frequente"),
+        ("UF com Maior Valor", uf_maior_valor, "Estado com maior valor total em notas"),
+        ("Valor Total da UF", formatar_valor_br(valor_uf_maior), "Valor total das notas da UF com maior valor"),
+        ("Percentual da UF", f"{percentual_uf_maior:.2f}%", "Percentual do faturamento representado pela UF com maior valor"),
+    ]
+
+    for i, (indicador, valor, obs) in enumerate(indicadores_geograficos):
+        adicionar_indicador(painel, indicador, valor, obs, i)
+
+    # Adiciona os top 5 municípios por quantidade
+    if "Município Prestador" in colunas:
+        # Adiciona subtítulo para os top 5 municípios
+        painel.append(None)
+        adicionar_subtitulo(painel, "Top 5 Municípios por Quantidade de Notas")
+
+        # Adiciona cabeçalhos para os top 5 municípios
+        adicionar_cabecalhos_tabela(painel, "Município", "Quantidade de Notas", "% do Total")
+
+        # Adiciona os top 5 municípios
+        municipios = agregados.ranking("Município Prestador", "quantidade")
+        top5_municipios = municipios.head(5)
+
+        for i, (municipio, qtd) in enumerate(top5_municipios.items()):
+            percentual = (qtd / total_notas) * 100 if total_notas > 0 else 0
+
+            adicionar_linha_tabela(painel, municipio, qtd, f"{percentual:.2f}%", i)
+
+        # Adiciona os top 5 municípios por valor
+        if "Base de Cálculo" in colunas:
+            # Adiciona subtítulo para os top 5 municípios por valor
+            painel.append(None)
+            adicionar_subtitulo(painel, "Top 5 Municípios por Valor")
+
+            # Adiciona cabeçalhos para os top 5 municípios por valor
+            adicionar_cabecalhos_tabela(painel, "Município", "Valor Total", "% do Faturamento")
+
+            # Adiciona os top 5 municípios por valor
+            municipios_por_valor = agregados.ranking("Município Prestador", "soma")
+            top5_municipios_valor = municipios_por_valor.head(5)
+
+            for i, (municipio, valor) in enumerate(top5_municipios_valor.items()):
+                percentual = (valor / total_base_calculo) * 100 if total_base_calculo > 0 else 0
+
+                adicionar_linha_tabela(painel, municipio, formatar_valor_br(valor), f"{percentual:.2f}%", i)
+
+    # 6.2 Distribuição por UF
+    if "UF Prestador" in colunas:
+        # Adiciona subtítulo para a seção
+        painel.append(None)
+        adicionar_titulo_secao(painel, "6.2 Distribuição por UF")
+
+        # Adiciona subtítulo para as UFs por quantidade
+        painel.append(None)
+        adicionar_subtitulo(painel, "UFs por Quantidade de Notas")
+
+        # Adiciona cabeçalhos para as UFs por quantidade
+        adicionar_cabecalhos_tabela(painel, "UF", "Quantidade de Notas", "% do Total")
+
+        # Adiciona as UFs por quantidade
+        ufs = agregados.ranking("UF Prestador", "quantidade")
+
+        for i, (uf, qtd) in enumerate(ufs.items()):
+            percentual = (qtd / total_notas) * 100 if total_notas > 0 else 0
+
+            adicionar_linha_tabela(painel, uf, qtd, f"{percentual:.2f}%", i)
+
+        # Adiciona as UFs por valor
+        if "Base de Cálculo" in colunas:
+            # Adiciona subtítulo para as UFs por valor
+            painel.append(None)
+            adicionar_subtitulo(painel, "UFs por Valor Total")
+
+            # Adiciona cabeçalhos para as UFs por valor
+            adicionar_cabecalhos_tabela(painel, "UF", "Valor Total", "% do Faturamento")
+
+            # UFs pela soma dos valores
+            ufs_por_valor = agregados.ranking("UF Prestador", "soma")
+
+            # Adiciona as UFs por valor
+            for i, (uf, valor) in enumerate(ufs_por_valor.items()):
+                percentual = (valor / total_base_calculo) * 100 if total_base_calculo > 0 else 0
+
+                adicionar_linha_tabela(painel, uf, formatar_valor_br(valor), f"{percentual:.2f}%", i)
+
+    return totais, painel
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+# Valores em reais guardados como inteiros em centavos (int64), para que somas, totais e
+# diferenças sejam exatos. Os valores chegam dos XMLs como texto em mais de um formato:
+#   "1234.56"  ponto decimal (padrão dos XMLs)
+#   "1234,56"  vírgula decimal
+#   "1.234,56" vírgula decimal com pontos separando os milhares
+# Valores vazios ou inválidos viram CENTAVOS_AUSENTE.
+
+CENTAVOS_AUSENTE = int(np.iinfo(np.int64).min)
+
+# Maior quantidade de dígitos na parte inteira que ainda cabe em um int64 de centavos
+_DIGITOS_MAXIMOS = 16
+# Textos mais longos que isso não são valores em reais e viram CENTAVOS_AUSENTE
+_TAMANHO_MAXIMO = 40
+
+def para_centavos(valores):
+    # Converte uma sequência de valores para um array int64 de centavos de uma só vez. Os textos
+    # viram uma matriz de bytes com uma linha por posição de caractere, e cada linha é lida
+    # pelos valores todos juntos, com operações do NumPy: o único laço em Python é sobre as
+    # posições (poucas dezenas), não sobre os valores. Frações com mais de dois dígitos são
+    # arredondadas para o centavo mais próximo
+    textos = [valor if isinstance(valor, str) and len(valor) <= _TAMANHO_MAXIMO else "" for valor in valores]
+    quantidade = len(textos)
+    if not quantidade:
+        return np.empty(0, dtype=np.int64)
+
+    # Todos os textos em um só buffer, espalhado depois na matriz (textos mais curtos ficam
+    # completados com zeros, tratados como espaço). Caracteres fora do ASCII viram "?"
+    tamanhos = np.fromiter(map(len, textos), dtype=np.int64, count=quantidade)
+    largura = int(tamanhos.max())
+    if not largura:
+        return np.full(quantidade, CENTAVOS_AUSENTE, dtype=np.int64)
+    bytes_textos = np.frombuffer("".join(textos).encode("ascii", "replace"), dtype=np.uint8)
+    deslocamentos = np.arange(0, quantidade * largura, largura) - (np.cumsum(tamanhos) - tamanhos)
+    matriz = np.zeros(quantidade * largura, dtype=np.uint8)
+    matriz[np.arange(len(bytes_textos)) + np.repeat(deslocamentos, tamanhos)] = bytes_textos
+    matriz = matriz.reshape(quantidade, largura).T.copy()
+
+    # Com vírgula, ela é o separador decimal e os pontos separam os milhares; sem vírgula, o
+    # separador decimal é o ponto
+    virgula_decimal = (matriz == 44).any(axis=0)
+    ponto_decimal = ~virgula_decimal
+
+    total = np.zeros(quantidade, dtype=np.int64)
+    casas = np.zeros(quantidade, dtype=np.int8)
+    digitos_inteiros = np.zeros(quantidade, dtype=np.int8)
+    arredondar = np.zeros(quantidade, dtype=bool)
+    negativo = np.zeros(quantidade, dtype=bool)
+    invalido = np.zeros(quantidade, dtype=bool)
+    tem_digito = np.zeros(quantidade, dtype=bool)
+    depois_separador = np.zeros(quantidade, dtype=bool)
+    dentro = np.zeros(quantidade, dtype=bool)  # já passou do espaço inicial
+    depois = np.zeros(quantidade, dtype=bool)  # já chegou ao espaço final
+    for caractere in matriz:
+        algarismo = caractere - np.uint8(48)
+        digito = algarismo <= 9
+        ponto = caractere == 46
+        separador = ((caractere == 44) & virgula_decimal) | (ponto & ponto_decimal)
+        milhar = ponto & virgula_decimal
+        menos = caractere == 45
+        sinal = menos | (caractere == 43)
+        espaco = (caractere == 0) | (caractere == 32) | ((caractere >= 9) & (caractere <= 13))
+        util = ~espaco
+
+        # Só dígitos, separadores, sinal antes do número e espaços nas pontas; nada de
+        # separador ou ponto de milhar depois do separador decimal
+        invalido |= ((util & ~(digito | separador | milhar | sinal))
+                     | (util & depois)
+                     | (sinal & dentro)
+                     | ((separador | milhar) & depois_separador))
+        negativo |= menos
+
+        # Soma os dígitos da parte inteira e os dois primeiros da fração; o terceiro dígito da
+        # fração decide o arredondamento
+        inteiro = digito & ~depois_separador
+        fracao = digito & depois_separador
+        usar = inteiro | (fracao & (casas < 2))
+        total = total * (1 + 9 * usar) + algarismo * usar
+        arredondar |= fracao & (casas == 2) & (algarismo >= 5)
+
+        casas += fracao
+        digitos_inteiros += inteiro
+        tem_digito |= digito
+        depois_separador |= separador
+        depois |= espaco & dentro
+        dentro |= util
+
+    # Completa os centavos que faltam ("12,5" -> 1250, "12" -> 1200)
+    casas = np.minimum(casas, 2)
+    total = total * np.power(10, 2 - casas, dtype=np.int64) + arredondar
+    total = np.where(negativo, -total, total)
+    return np.where(tem_digito & ~invalido & (digitos_inteiros <= _DIGITOS_MAXIMOS), total, CENTAVOS_AUSENTE)
+
+def para_array(centavos):
+    # Array de centavos (com CENTAVOS_AUSENTE) como array inteiro do pandas, que entende valores
+    # ausentes, sem copiar os valores
+    return pd.arrays.IntegerArray(centavos, centavos == CENTAVOS_AUSENTE)
+
+def para_reais(centavos):
+    # Valores em reais (float) para a planilha; ausentes viram NaN (célula vazia)
+    return pd.Series(centavos).to_numpy(dtype=np.float64, na_value=np.nan) / 100
+
+def formatar_reais(centavos):
+    # "R$ 1.234,56" a partir de um valor em centavos (médias e desvios podem ter fração de centavo)
+    if centavos is None or pd.isna(centavos):
+        centavos = 0
+    centavos = int(round(centavos))
+    sinal = "-" if centavos < 0 else ""
+    reais, resto = divmod(abs(centavos), 100)
+    return f"R$ {sinal}{reais:,}".replace(",", ".") + f",{resto:02d}"
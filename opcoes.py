@@ -0,0 +1,24 @@
+import importlib.util
+
+# Opções do processamento que a interface e o terminal precisam antes de carregar o módulo
+# principal (ver main.py), que importa pandas, numpy e o backend de XML: diretórios padrão e
+# formatos de saída. Este módulo só usa a biblioteca padrão; a disponibilidade do pyarrow é
+# verificada sem importá-lo.
+
+# Diretórios padrão dos XMLs e dos arquivos gerados
+DIRETORIO_ENTRADA = "nfs"
+DIRETORIO_SAIDA = "Notas_Processadas"
+
+# Formatos de saída (ver saidas.py); os formatos além do xlsx precisam do pyarrow
+FORMATOS_SAIDA = {
+    "xlsx": "Excel",
+    "parquet": "Parquet",
+    "csv": "CSV",
+    "arrow": "Arrow IPC",
+}
+
+def formato_disponivel(formato):
+    return formato == "xlsx" or (formato in FORMATOS_SAIDA and importlib.util.find_spec("pyarrow") is not None)
+
+def extensao(formato):
+    return f".{formato}"
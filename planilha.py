@@ -0,0 +1,225 @@
+import numpy as np
+import pandas as pd
+import xlsxwriter
+from xlsxwriter.exceptions import FileCreateError
+
+import moeda
+
+# Gravação da planilha em uma única passada, com o xlsxwriter em modo constant_memory: cada
+# linha é gravada uma só vez, já com a formatação, e vai direto para o disco. A linha de totais,
+# o cabeçalho, as larguras das colunas e a aba "Indicadores" (ver indicadores.py) são montados
+# junto com os dados, sem reabrir o arquivo. As notas chegam em lotes (ver PlanilhaNotas), então
+# o uso de memória não depende do tamanho da planilha, e seguem em abas novas quando passam do
+# limite de linhas do Excel. Os indicadores já chegam calculados; aqui só se decide como cada
+# linha aparece.
+
+ABA_NOTAS = "Notas Fiscais"
+ABA_INDICADORES = "Indicadores"
+
+# Mesmo formato de data e hora que o pandas usava ao gravar a planilha
+FORMATO_DATA = "YYYY-MM-DD HH:MM:SS"
+LARGURA_MAXIMA_COLUNA = 50
+# Limite de linhas de uma aba do Excel (cabeçalho e totais incluídos)
+LIMITE_LINHAS_ABA = 1048576
+# Quantidade de notas sugerida para cada lote gravado
+TAMANHO_LOTE = 50000
+TAMANHO_AMOSTRA_LARGURA = 1000
+LARGURAS_INDICADORES = (30, 30, 45)
+
+CINZA_TOTAIS = "#E6E6E6"
+CINZA_SECAO = "#D9D9D9"
+CINZA_ALTERNADO = "#F5F5F5"
+
+# Datas do Excel contam dias desde 30/12/1899
+_DIAS_1899_A_1970 = 25569
+_MICROSSEGUNDOS_POR_DIA = 86400 * 1000000
+
+def calcular_larguras(df_planilha):
+    # Largura de cada coluna pelo maior texto da coluna (ou das primeiras linhas, em planilhas
+    # grandes, para que as larguras sejam as mesmas a cada execução) e do cabeçalho, limitada a
+    # LARGURA_MAXIMA_COLUNA. Valores ausentes (datas vazias, campos que o XML não tem) contam
+    # como texto vazio
+    larguras = []
+    for coluna in df_planilha.columns:
+        valores = df_planilha[coluna].head(TAMANHO_AMOSTRA_LARGURA)
+        maior = valores.astype(str).str.len().fillna(0).max() if len(valores) else 0
+        tamanho = max(int(maior), len(str(coluna))) + 2
+        larguras.append(min(tamanho, LARGURA_MAXIMA_COLUNA))
+    return larguras
+
+def _valores_coluna(serie):
+    # Valores de uma coluna prontos para gravar, como objetos do Python, e o tipo da coluna:
+    # "numero", "texto" ou None (valores de mais de um tipo). Ausentes viram None e a célula
+    # fica vazia
+    valores = serie.to_numpy()
+    if valores.dtype.kind == "M":
+        # Datas viram o número de série do Excel, calculado de uma vez para a coluna inteira
+        microssegundos = valores.astype("datetime64[us]").view(np.int64)
+        dias, resto = np.divmod(microssegundos, _MICROSSEGUNDOS_POR_DIA)
+        serie_excel = (dias + _DIAS_1899_A_1970) + resto / _MICROSSEGUNDOS_POR_DIA
+        return [None if ausente else valor for valor, ausente in zip(serie_excel.tolist(), np.isnat(valores).tolist())], "numero"
+    if valores.dtype.kind in "iuf":
+        if valores.dtype.kind == "f":
+            return [None if valor != valor else valor for valor in valores.tolist()], "numero"
+        return valores.tolist(), "numero"
+    valores = [None if valor is None or valor != valor else valor for valor in valores.tolist()]
+    return valores, "texto" if all(isinstance(valor, str) for valor in valores if valor is not None) else None
+
+def em_reais(df_notas, colunas_moeda):
+    # Cópia rasa do DataFrame com as colunas de `colunas_moeda` (em centavos) em reais
+    colunas = {coluna: moeda.para_reais(df_notas[coluna]) if coluna in colunas_moeda else df_notas[coluna]
+               for coluna in df_notas.columns}
+    return pd.DataFrame(colunas, columns=df_notas.columns, copy=False)
+
+class _Formatos:
+    # Cria cada combinação de formatação uma só vez no livro
+    def __init__(self, livro):
+        self.livro = livro
+        self.criados = {}
+
+    def __call__(self, **propriedades):
+        chave = tuple(sorted(propriedades.items()))
+        formato = self.criados.get(chave)
+        if formato is None:
+            formato = self.criados[chave] = self.livro.add_format(propriedades)
+        return formato
+
+def _gravar_valor(ws, linha, coluna, valor, formato):
+    if valor is None:
+        ws.write_blank(linha, coluna, None, formato)
+    elif isinstance(valor, str):
+        ws.write_string(linha, coluna, valor, formato)
+    elif isinstance(valor, np.generic):
+        ws.write(linha, coluna, valor.item(), formato)
+    else:
+        ws.write(linha, coluna, valor, formato)
+
+class PlanilhaNotas:
+    # Planilha gravada aos poucos: as notas chegam em lotes (DataFrames com as colunas de
+    # `colunas`) e cada lote vai direto para o disco, então a memória usada depende do tamanho
+    # do lote e não da quantidade de notas. Quando uma aba chega ao limite de linhas do Excel,
+    # as notas seguintes continuam em "Notas Fiscais (2)", "Notas Fiscais (3)"... A linha de
+    # `totais` fica só na primeira aba; cada aba tem o seu cabeçalho e larguras calculadas pelo
+    # primeiro lote que recebe. As colunas de `colunas_moeda` chegam em centavos (ver moeda.py)
+    # e são gravadas em reais
+    def __init__(self, arquivo_saida, colunas, totais=None, formatos_colunas=None, colunas_moeda=()):
+        self.livro = xlsxwriter.Workbook(arquivo_saida, {"constant_memory": True})
+        self.formatos = _Formatos(self.livro)
+        self.colunas = list(colunas)
+        self.totais = totais
+        self.formatos_colunas = formatos_colunas or {}
+        self.colunas_moeda = list(colunas_moeda)
+        self.abas = 0
+        self.ws = None
+        self.linha = 0
+        self.quantidade = 0
+
+    def _nova_aba(self, df_lote):
+        self.abas += 1
+        nome = ABA_NOTAS if self.abas == 1 else f"{ABA_NOTAS} ({self.abas})"
+        ws = self.ws = self.livro.add_worksheet(nome)
+        for indice, largura in enumerate(calcular_larguras(df_lote)):
+            ws.set_column(indice, indice, largura)
+
+        self.linha = 0
+        if self.totais is not None and self.abas == 1:
+            # Linha de totais acima do cabeçalho, em todas as colunas
+            formato_totais = self.formatos(bold=True, align="center", valign="vcenter", pattern=1, bg_color=CINZA_TOTAIS)
+            for indice, coluna in enumerate(self.colunas):
+                _gravar_valor(ws, self.linha, indice, self.totais.get(coluna), formato_totais)
+            self.linha += 1
+
+        formato_cabecalho = self.formatos(bold=True, border=1, align="center", valign="vcenter")
+        for indice, coluna in enumerate(self.colunas):
+            ws.write_string(self.linha, indice, str(coluna), formato_cabecalho)
+        self.linha += 1
+
+    def gravar(self, df_lote):
+        # Acrescenta as notas de um lote, abrindo abas novas quando necessário
+        if self.colunas_moeda:
+            df_lote = em_reais(df_lote, self.colunas_moeda)
+        inicio = 0
+        while inicio < len(df_lote):
+            if self.ws is None or self.linha >= LIMITE_LINHAS_ABA:
+                self._nova_aba(df_lote.iloc[inicio:])
+            fim = min(len(df_lote), inicio + LIMITE_LINHAS_ABA - self.linha)
+            self._gravar_linhas(df_lote.iloc[inicio:fim])
+            inicio = fim
+
+    def _gravar_linhas(self, df_lote):
+        # Uma coluna por vez vira uma lista de valores do Python; a gravação percorre as linhas
+        # chamando, para cada coluna, o método do seu tipo (write, que descobre o tipo de cada
+        # valor, só nas colunas com valores de mais de um tipo)
+        ws = self.ws
+        metodos = {"numero": ws.write_number, "texto": ws.write_string, None: ws.write}
+        gravadores = []
+        for coluna in self.colunas:
+            valores, tipo = _valores_coluna(df_lote[coluna])
+            if df_lote[coluna].dtype.kind == "M":
+                formato = self.formatos(num_format=FORMATO_DATA)
+            elif coluna in self.formatos_colunas:
+                formato = self.formatos(num_format=self.formatos_colunas[coluna])
+            else:
+                formato = None
+            gravadores.append((valores, metodos[tipo], formato))
+
+        linha = self.linha
+        for posicao in range(len(df_lote)):
+            for indice, (valores, gravar, formato) in enumerate(gravadores):
+                valor = valores[posicao]
+                if valor is not None:
+                    gravar(linha, indice, valor, formato)
+            linha += 1
+        self.linha = linha
+        self.quantidade += len(df_lote)
+
+    def fechar(self, painel=None):
+        # Acrescenta a aba "Indicadores" (se houver `painel`) e grava o arquivo. Sem nenhuma
+        # nota, a aba "Notas Fiscais" fica só com o cabeçalho
+        if self.ws is None:
+            self._nova_aba(pd.DataFrame(columns=self.colunas))
+        if painel is not None:
+            _gravar_indicadores(self.livro, self.formatos, painel)
+        try:
+            self.livro.close()
+        except FileCreateError as e:
+            # Mantém o erro original (ex.: PermissionError com a planilha aberta no Excel)
+            raise e.args[0] from None
+
+def _gravar_indicadores(livro, formatos, painel):
+    ws = livro.add_worksheet(ABA_INDICADORES)
+    for indice, largura in enumerate(LARGURAS_INDICADORES):
+        ws.set_column(indice, indice, largura)
+
+    for linha, item in enumerate(painel):
+        if item is None:
+            continue
+        tipo = item[0]
+        if tipo == "titulo":
+            ws.merge_range(linha, 0, linha, 2, item[1], formatos(bold=True, font_size=14, align="center"))
+        elif tipo == "secao":
+            ws.merge_range(linha, 0, linha, 2, item[1], formatos(bold=True, font_size=12, align="left", pattern=1, bg_color=CINZA_SECAO))
+        elif tipo == "subtitulo":
+            ws.merge_range(linha, 0, linha, 2, item[1], formatos(bold=True, align="left"))
+        elif tipo in ("cabecalhos", "cabecalhos_tabela"):
+            # Os cabeçalhos das tabelas têm borda; os das listas de indicadores, não
+            borda = {"border": 1} if tipo == "cabecalhos_tabela" else {}
+            formato = formatos(bold=True, align="center", pattern=1, bg_color=CINZA_TOTAIS, **borda)
+            for coluna, valor in enumerate(item[1:4]):
+                _gravar_valor(ws, linha, coluna, valor, formato)
+        else:
+            *valores, i = item[1:]
+            if tipo == "indicador":
+                # Valores numéricos, monetários ou percentuais são alinhados à direita; textos
+                # (como nomes de municípios, UFs) à esquerda
+                valor = valores[1]
+                if isinstance(valor, (int, float)) or (isinstance(valor, str) and (valor.startswith('R$') or '%' in valor or ',' in valor)):
+                    alinhamentos = ("left", "right", "left")
+                else:
+                    alinhamentos = ("left", "left", "left")
+            else:
+                alinhamentos = ("left", "right", "center")
+            # Cor de fundo alternada para facilitar a leitura
+            fundo = {"pattern": 1, "bg_color": CINZA_ALTERNADO} if i % 2 == 0 else {}
+            for coluna, (valor, alinhamento) in enumerate(zip(valores, alinhamentos)):
+                _gravar_valor(ws, linha, coluna, valor, formatos(align=alinhamento, border=1, **fundo))
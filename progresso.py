@@ -0,0 +1,143 @@
+import time
+
+# Progresso de uma execução de main(), publicado como eventos em uma fila para quem acompanha o
+# processamento de outra thread (a interface, ver easyxml_gui.py). O processamento só coloca os
+# eventos na fila, sem esperar por quem os lê; a interface os consome no seu próprio ritmo.
+#
+# Cada evento é um dicionário com:
+#   etapa         nome da etapa (ETAPA_*)
+#   arquivos      arquivos já lidos, de total_arquivos
+#   bytes         bytes já lidos dos XMLs, de total_bytes
+#   notas         notas extraídas até agora
+#   fracao        fração lida dos XMLs (0 a 1), pelos bytes
+#   decorrido     segundos desde o início da leitura
+#   restante      segundos estimados para terminar a leitura (None enquanto não há estimativa)
+#
+# Durante a leitura os eventos são limitados a um a cada INTERVALO_EVENTOS segundos; mudanças
+# de etapa sempre são publicadas. A leitura de um arquivo é acompanhada por dentro só quando ela
+# é feita no próprio processo (ver lendo); nos processos de extrair_arquivos não há execução
+# ativa e as chamadas não fazem nada.
+#
+# A execução também pode ser cancelada por quem a acompanha, marcando o `cancelamento` (um
+# threading.Event ou multiprocessing.Event) passado a iniciar. O cancelamento é verificado nos
+# mesmos pontos em que a leitura é publicada, antes da limitação de intervalo, e interrompe a
+# execução com a exceção Cancelado.
+
+ETAPA_VERIFICANDO = "Verificando arquivos"
+ETAPA_LENDO = "Lendo arquivos"
+ETAPA_SALVANDO = "Salvando"
+ETAPA_CONCLUIDO = "Concluído"
+# Publicada por quem executa main() quando ela termina, com `erro` (texto ou None) e `cancelado`
+ETAPA_FIM = "Fim"
+
+# Intervalo mínimo, em segundos, entre dois eventos de leitura
+INTERVALO_EVENTOS = 0.2
+
+_atual = None
+
+def formatar_tempo(segundos):
+    # Formata uma duração em segundos, minutos ou horas
+    if segundos < 60:
+        return f"{segundos:.0f} segundos"
+    elif segundos < 3600:
+        return f"{segundos/60:.1f} minutos"
+    else:
+        return f"{segundos/3600:.1f} horas"
+
+class Cancelado(BaseException):
+    # Deriva de BaseException, como o KeyboardInterrupt, para não ser tratada como o erro de um
+    # arquivo pelos `except Exception` da extração
+    pass
+
+class Progresso:
+    def __init__(self, fila, intervalo=INTERVALO_EVENTOS, cancelamento=None):
+        self.fila = fila
+        self.cancelamento = cancelamento
+        self.intervalo = intervalo
+        self.etapa = ETAPA_VERIFICANDO
+        self.arquivos = 0
+        self.total_arquivos = 0
+        self.bytes = 0
+        self.total_bytes = 0
+        self.notas = 0
+        # Bytes e notas do arquivo sendo lido, ainda não somados aos totais
+        self.bytes_arquivo = 0
+        self.notas_arquivo = 0
+        self.inicio = time.monotonic()
+        self.ultimo = 0
+
+    def mudar_etapa(self, etapa, total_arquivos=None, total_bytes=None):
+        self.etapa = etapa
+        if total_arquivos is not None:
+            self.total_arquivos = total_arquivos
+        if total_bytes is not None:
+            self.total_bytes = total_bytes
+        if etapa == ETAPA_LENDO:
+            self.inicio = time.monotonic()
+        self._publicar()
+
+    def verificar_cancelamento(self):
+        if self.cancelamento is not None and self.cancelamento.is_set():
+            raise Cancelado()
+
+    def lendo(self, bytes_lidos, notas):
+        # Posição dentro do arquivo sendo lido
+        self.verificar_cancelamento()
+        self.bytes_arquivo = bytes_lidos
+        self.notas_arquivo = notas
+        self._publicar_limitado()
+
+    def arquivo_lido(self, tamanho, notas):
+        self.verificar_cancelamento()
+        self.arquivos += 1
+        self.bytes += tamanho
+        self.notas += notas
+        self.bytes_arquivo = 0
+        self.notas_arquivo = 0
+        self._publicar_limitado()
+
+    def evento(self):
+        lidos = min(self.bytes + self.bytes_arquivo, self.total_bytes) if self.total_bytes else self.bytes
+        fracao = lidos / self.total_bytes if self.total_bytes else 0
+        decorrido = time.monotonic() - self.inicio
+        restante = decorrido * (1 - fracao) / fracao if self.etapa == ETAPA_LENDO and 0 < fracao < 1 else None
+        return {
+            "etapa": self.etapa,
+            "arquivos": self.arquivos,
+            "total_arquivos": self.total_arquivos,
+            "bytes": lidos,
+            "total_bytes": self.total_bytes,
+            "notas": self.notas + self.notas_arquivo,
+            "fracao": fracao,
+            "decorrido": decorrido,
+            "restante": restante,
+        }
+
+    def _publicar_limitado(self):
+        if time.monotonic() - self.ultimo >= self.intervalo:
+            self._publicar()
+
+    def _publicar(self):
+        self.ultimo = time.monotonic()
+        if self.fila is not None:
+            self.fila.put_nowait(self.evento())
+
+def iniciar(fila, cancelamento=None):
+    # Começa a publicar o progresso da execução em `fila` (queue.Queue ou afim) e a atender o
+    # `cancelamento`; sem nenhum dos dois, não há execução acompanhada e as funções abaixo não
+    # fazem nada
+    global _atual
+    _atual = Progresso(fila, cancelamento=cancelamento) if fila is not None or cancelamento is not None else None
+    return _atual
+
+def mudar_etapa(etapa, total_arquivos=None, total_bytes=None):
+    if _atual is not None:
+        _atual.mudar_etapa(etapa, total_arquivos, total_bytes)
+
+def lendo(bytes_lidos, notas):
+    if _atual is not None:
+        _atual.lendo(bytes_lidos, notas)
+
+def arquivo_lido(tamanho, notas):
+    if _atual is not None:
+        _atual.arquivo_lido(tamanho, notas)
@@ -0,0 +1,75 @@
+import atexit
+import logging
+import logging.handlers
+import multiprocessing
+import sys
+
+# Configuração do log do EasyXML. As mensagens não são gravadas por quem as gera: o handler da
+# raiz só as coloca em uma fila (QueueHandler) e uma thread à parte (QueueListener) as grava no
+# arquivo e na tela. Assim a extração não espera pelo disco, e os processos de extrair_arquivos
+# (ver main.py) mandam suas mensagens para a mesma fila, em vez de cada um abrir o arquivo.
+#
+# Mensagens do caminho de extração usam argumentos no estilo % ("Arquivo %s", nome), formatados
+# só se o nível estiver ativo. O DEBUG fica desligado por padrão; ligado, as mensagens de cada
+# nota saem só a cada AMOSTRA_NOTAS_DEBUG notas (ver depurar_nota).
+
+FORMATO = '%(asctime)s - %(levelname)s - %(message)s'
+# Uma a cada quantas notas tem a mensagem de DEBUG por nota
+AMOSTRA_NOTAS_DEBUG = 1000
+
+_fila = None
+_ouvinte = None
+
+def configurar(arquivo_log, nivel=logging.INFO):
+    # Grava o log em `arquivo_log` e na saída padrão, a partir do nível `nivel`. Chamadas
+    # seguintes só mudam o nível
+    global _fila, _ouvinte
+    raiz = logging.getLogger()
+    raiz.setLevel(nivel)
+    if _ouvinte is not None:
+        return
+
+    formatador = logging.Formatter(FORMATO)
+    handlers = [logging.FileHandler(arquivo_log, encoding="utf-8"), logging.StreamHandler(sys.stdout)]
+    for handler in handlers:
+        handler.setFormatter(formatador)
+
+    # Fila do multiprocessing para que os processos de extração também possam usá-la. Criada no
+    # contexto "spawn", ela serve tanto aos processos copiados (fork) quanto aos criados do
+    # zero, como os de execucao.py
+    _fila = multiprocessing.get_context("spawn").Queue(-1)
+    _ouvinte = logging.handlers.QueueListener(_fila, *handlers, respect_handler_level=True)
+    _ouvinte.start()
+    atexit.register(encerrar)
+
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    raiz.addHandler(logging.handlers.QueueHandler(_fila))
+
+def encerrar():
+    # Grava as mensagens que ainda estão na fila e para a thread do log
+    global _ouvinte
+    if _ouvinte is not None:
+        _ouvinte.stop()
+        _ouvinte = None
+
+def iniciar_processo(fila, nivel):
+    # Inicializador dos processos de extração: as mensagens vão para a fila do processo principal
+    raiz = logging.getLogger()
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    raiz.addHandler(logging.handlers.QueueHandler(fila))
+    raiz.setLevel(nivel)
+
+def argumentos_processos():
+    # Argumentos de inicialização para um ProcessPoolExecutor (initializer/initargs); sem o log
+    # configurado por aqui, os processos ficam com a configuração que herdarem
+    if _fila is None:
+        return {}
+    return {"initializer": iniciar_processo, "initargs": (_fila, logging.getLogger().level)}
+
+def depurar_nota(indice, mensagem, *argumentos):
+    # DEBUG de uma nota, só para uma a cada AMOSTRA_NOTAS_DEBUG. Quem chama deve antes testar
+    # logging.getLogger().isEnabledFor(logging.DEBUG) uma vez, fora do laço das notas
+    if indice % AMOSTRA_NOTAS_DEBUG == 0:
+        logging.debug(mensagem, *argumentos)
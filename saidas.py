@@ -0,0 +1,181 @@
+import logging
+import os
+import pickle
+import tempfile
+
+import numpy as np
+
+from indicadores import AcumuladorIndicadores
+from opcoes import FORMATOS_SAIDA, extensao, formato_disponivel
+from planilha import PlanilhaNotas
+
+# Formatos de saída das notas. Todos recebem as notas do mesmo jeito, em lotes (DataFrames com
+# as colunas da tabela, valores em reais em centavos inteiros), por gravar(df_lote), e terminam
+# com fechar(), ou com descartar(), que não deixa o arquivo de saída pela metade:
+#   xlsx:    planilha do Excel com totais, formatação e a aba de indicadores (ver planilha.py e
+#            indicadores.py)
+#   parquet: arquivo Parquet comprimido (zstd), com o tipo de cada coluna
+#   csv:     texto separado por vírgulas, em UTF-8, com ponto decimal
+#   arrow:   arquivo Arrow IPC, lido sem conversão pelo pandas, Polars, DuckDB e afins
+# Os formatos além do xlsx são gravados pelo pyarrow, que só é necessário para eles. Neles os
+# valores em reais são decimais exatos com duas casas e as datas ficam sem fuso horário. A lista
+# dos formatos fica em opcoes.py, que a interface lê sem importar este módulo.
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+def _decimal(serie):
+    # Centavos (array inteiro do pandas) como decimal do Arrow com duas casas, sem passar por
+    # float: o decimal guarda o próprio valor em centavos como inteiro de 128 bits
+    centavos = serie.to_numpy(dtype=np.int64, na_value=0)
+    partes = np.empty((len(centavos), 2), dtype=np.int64)
+    partes[:, 0] = centavos
+    partes[:, 1] = centavos >> 63  # parte alta: só o sinal
+    validos = pa.array(serie.notna().to_numpy(), type=pa.bool_())
+    return pa.Array.from_buffers(pa.decimal128(18, 2), len(centavos), [validos.buffers()[1], pa.py_buffer(partes)])
+
+class SaidaExcel:
+    # A planilha começa pela linha de totais e termina com a aba de indicadores, que dependem de
+    # todas as notas, e é gravada em ordem (ver planilha.py). Por isso os lotes ficam em um
+    # arquivo temporário até o fechamento; os indicadores são acumulados a cada lote (ver
+    # AcumuladorIndicadores), sem guardar as notas na memória. No fechamento os lotes, relidos
+    # um por vez, vão para a planilha
+    def __init__(self, arquivo_saida, colunas, colunas_moeda=(), formatos_colunas=None):
+        self.arquivo_saida = arquivo_saida
+        self.colunas = list(colunas)
+        self.colunas_moeda = list(colunas_moeda)
+        self.formatos_colunas = formatos_colunas
+        self.temporario = tempfile.TemporaryFile(prefix="easyxml_")
+        self.lotes = 0
+        self.indicadores = AcumuladorIndicadores()
+        self.quantidade = 0
+        self.abas = 0
+
+    def gravar(self, df_lote):
+        if not len(df_lote):
+            return
+        pickle.dump(df_lote, self.temporario, protocol=pickle.HIGHEST_PROTOCOL)
+        self.lotes += 1
+        self.quantidade += len(df_lote)
+        if self.indicadores is not None:
+            try:
+                self.indicadores.adicionar(df_lote)
+            except Exception as e:
+                self._sem_indicadores(e)
+
+    def _sem_indicadores(self, erro):
+        # Sem os totais e o painel de indicadores, a planilha é gravada só com as notas
+        logging.warning("Não foi possível calcular os indicadores: %s", erro)
+        logging.warning("O arquivo Excel será salvo sem os indicadores")
+        self.indicadores = None
+
+    def _calcular_indicadores(self):
+        if not self.lotes or self.indicadores is None:
+            return None, None
+        try:
+            return self.indicadores.calcular(self.colunas[0])
+        except Exception as e:
+            self._sem_indicadores(e)
+            return None, None
+
+    def fechar(self):
+        try:
+            totais, painel = self._calcular_indicadores()
+            planilha = PlanilhaNotas(self.arquivo_saida, self.colunas, totais, self.formatos_colunas, self.colunas_moeda)
+            self.temporario.seek(0)
+            for _ in range(self.lotes):
+                planilha.gravar(pickle.load(self.temporario))
+            planilha.fechar(painel)
+            self.abas = planilha.abas
+        finally:
+            self.temporario.close()
+
+    def descartar(self):
+        # A planilha só é criada no fechamento: basta apagar os lotes
+        self.temporario.close()
+
+class _SaidaArrow:
+    # Converte cada lote em uma tabela do Arrow e a repassa para o escritor do formato, aberto no
+    # primeiro lote com o esquema (tipos das colunas) tirado dele
+    def __init__(self, arquivo_saida, colunas, colunas_moeda=()):
+        self.arquivo_saida = arquivo_saida
+        self.colunas = list(colunas)
+        self.colunas_moeda = set(colunas_moeda)
+        self.esquema = None
+        self.escritor = None
+        self.quantidade = 0
+
+    def _tipo(self, coluna, serie):
+        if coluna in self.colunas_moeda:
+            return pa.decimal128(18, 2)
+        if serie.dtype.kind == "M":
+            return pa.timestamp("us")
+        if serie.dtype.kind == "f":
+            return pa.float64()
+        if serie.dtype.kind in "iu":
+            return pa.int64()
+        return pa.string()
+
+    def _tabela(self, df_lote):
+        if self.esquema is None:
+            self.esquema = pa.schema([(coluna, self._tipo(coluna, df_lote[coluna])) for coluna in self.colunas])
+        arrays = []
+        for campo in self.esquema:
+            serie = df_lote[campo.name]
+            if campo.name in self.colunas_moeda:
+                arrays.append(_decimal(serie))
+            else:
+                arrays.append(pa.array(serie, type=campo.type, from_pandas=True))
+        return pa.Table.from_arrays(arrays, schema=self.esquema)
+
+    def gravar(self, df_lote):
+        if not len(df_lote):
+            return
+        tabela = self._tabela(df_lote)
+        if self.escritor is None:
+            self.escritor = self._abrir()
+        self.escritor.write_table(tabela)
+        self.quantidade += len(df_lote)
+
+    def fechar(self):
+        if self.escritor is None:
+            # Sem nenhuma nota o arquivo fica só com as colunas
+            if self.esquema is None:
+                self.esquema = pa.schema([(coluna, pa.string()) for coluna in self.colunas])
+            self.escritor = self._abrir()
+        self.escritor.close()
+
+    def descartar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+        if os.path.exists(self.arquivo_saida):
+            os.remove(self.arquivo_saida)
+
+class SaidaParquet(_SaidaArrow):
+    def _abrir(self):
+        return pq.ParquetWriter(self.arquivo_saida, self.esquema, compression="zstd")
+
+class SaidaCSV(_SaidaArrow):
+    def _abrir(self):
+        return pa_csv.CSVWriter(self.arquivo_saida, self.esquema)
+
+class SaidaArrowIPC(_SaidaArrow):
+    def _abrir(self):
+        return pa.ipc.new_file(self.arquivo_saida, self.esquema)
+
+def abrir_saida(formato, arquivo_saida, colunas, colunas_moeda=(), formatos_colunas=None):
+    # Abre a saída do formato escolhido. `formatos_colunas` só vale para o xlsx
+    if formato not in FORMATOS_SAIDA:
+        raise ValueError(f"Formato de saída desconhecido: {formato}. Opções: {', '.join(FORMATOS_SAIDA)}")
+    if formato != "xlsx" and pa is None:
+        raise ImportError(f"O formato {formato} precisa do pyarrow (pip install pyarrow)")
+    if formato == "xlsx":
+        return SaidaExcel(arquivo_saida, colunas, colunas_moeda, formatos_colunas)
+    if formato == "parquet":
+        return SaidaParquet(arquivo_saida, colunas, colunas_moeda)
+    if formato == "csv":
+        return SaidaCSV(arquivo_saida, colunas, colunas_moeda)
+    return SaidaArrowIPC(arquivo_saida, colunas, colunas_moeda)
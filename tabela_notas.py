@@ -0,0 +1,255 @@
+import array
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import moeda
+
+# Tabela das notas extraídas guardada por coluna, cada uma em um buffer do seu tipo, em vez de
+# uma lista de strings por nota. Assim os valores já chegam ao DataFrame como números e datas,
+# sem conversões depois, e cada nota ocupa bem menos memória. Tipos de coluna:
+#   "texto": strings que se repetem entre as notas (prestador, tomador, município, códigos);
+#            cada valor diferente é guardado uma só vez
+#   "identificador": strings próprias de cada nota (número, código de verificação), guardadas
+#            como vieram
+#   "categoria": strings com poucos valores diferentes em todas as notas (UF, município, código
+#            de serviço, "Sim"/"Não"): cada valor diferente é guardado uma vez, em uma lista, e
+#            cada nota guarda só a posição dele (um int32; -1 se ausente). No DataFrame a
+#            coluna já vem como Categorical, sem passar pelas strings
+#   "valor": números, em um array de float64; valores vazios ou inválidos viram NaN
+#   "data": data e hora em um array de inteiros (microssegundos desde 1970, sem fuso horário);
+#            datas vazias ou inválidas viram NaT
+#   "moeda": valores em reais como inteiros em centavos (ver moeda.py); vazios ou inválidos
+#            ficam ausentes. Os textos ficam pendentes e são convertidos juntos, a cada
+#            LOTE_MOEDA linhas: as tabelas de cada arquivo, quase sempre menores, só os repassam
+#            para a tabela que junta todos os arquivos
+TIPOS = ("texto", "identificador", "categoria", "valor", "data", "moeda")
+
+LOTE_MOEDA = 8192
+
+VALOR_AUSENTE = float("nan")
+DATA_AUSENTE = int(np.iinfo(np.int64).min)  # representação do NaT no NumPy
+_ORDINAL_1970 = datetime(1970, 1, 1).toordinal()
+
+def converter_valor(valor):
+    # Valores dos XMLs usam ponto decimal ("1234.56"), mas aceita também vírgula ("1234,56")
+    if isinstance(valor, str):
+        try:
+            return float(valor.replace(',', '.'))
+        except ValueError:
+            return VALOR_AUSENTE
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    return VALOR_AUSENTE
+
+def converter_data(valor):
+    # Datas ISO ("2022-01-03" ou "2022-01-03T13:10:08-03:00"). O fuso é descartado e fica a
+    # hora local da nota, como na planilha gerada até aqui
+    if not isinstance(valor, str):
+        return DATA_AUSENTE
+    try:
+        data = datetime.fromisoformat(valor)
+    except ValueError:
+        # Versões antigas do Python não aceitam "Z" nem frações de segundo fora do padrão
+        try:
+            data = datetime.fromisoformat(valor[:19])
+        except ValueError:
+            return DATA_AUSENTE
+    segundos = (data.toordinal() - _ORDINAL_1970) * 86400 + data.hour * 3600 + data.minute * 60 + data.second
+    return segundos * 1000000 + data.microsecond
+
+def _internar(vistos, valor):
+    # Devolve a cópia já guardada de um valor repetido (valores não hashable ficam como estão)
+    try:
+        return vistos.setdefault(valor, valor)
+    except TypeError:
+        return valor
+
+def _codificar(codigos, categorias, valor):
+    # Posição de um valor na lista de categorias, acrescentando os valores novos
+    try:
+        codigo = codigos.get(valor)
+    except TypeError:
+        valor = str(valor)
+        codigo = codigos.get(valor)
+    if codigo is None:
+        if valor is None or valor != valor:
+            return -1
+        codigo = codigos[valor] = len(categorias)
+        categorias.append(valor)
+    return codigo
+
+def _completar(linha, quantidade):
+    # Linhas com menos colunas que a tabela (ou mais) são ajustadas ao tamanho da tabela
+    linha = list(linha[:quantidade])
+    return linha + [None] * (quantidade - len(linha))
+
+def _converter_pendentes(dados, pendentes):
+    # Converte os textos pendentes das colunas "moeda" para centavos, todos de uma vez
+    for buffer, textos in zip(dados, pendentes):
+        if textos:
+            buffer.frombytes(moeda.para_centavos(textos).tobytes())
+            textos.clear()
+
+def _novo_buffer(tipo):
+    if tipo == "valor":
+        return array.array("d")
+    if tipo in ("data", "moeda"):
+        return array.array("q")
+    if tipo == "categoria":
+        return array.array("i")
+    return []
+
+class TabelaNotas:
+    def __init__(self, colunas, tipos=None):
+        # `tipos` associa colunas a um dos TIPOS; as colunas que não estão nele são "texto"
+        tipos = tipos or {}
+        self.colunas = list(colunas)
+        self.tipos = [tipos.get(coluna, "texto") for coluna in self.colunas]
+        for coluna, tipo in zip(self.colunas, self.tipos):
+            if tipo not in TIPOS:
+                raise ValueError(f"Tipo de coluna desconhecido para {coluna}: {tipo}")
+        self.dados = [_novo_buffer(tipo) for tipo in self.tipos]
+        # Textos das colunas "moeda" ainda não convertidos, por coluna (None nas outras)
+        self.pendentes = [[] if tipo == "moeda" else None for tipo in self.tipos]
+        self._moedas = [indice for indice, tipo in enumerate(self.tipos) if tipo == "moeda"]
+        # Valores diferentes das colunas "categoria", na ordem das posições (None nas outras)
+        self.categorias = [[] if tipo == "categoria" else None for tipo in self.tipos]
+        self._preparar()
+
+    def _preparar(self):
+        # Gera a função que acrescenta uma linha, com uma instrução por coluna, para que nenhum
+        # laço sobre as colunas rode por nota (como em compilar_plano, no main.py). A função só
+        # guarda os buffers, nunca a própria tabela: sem ciclos de referências, os buffers são
+        # liberados assim que a tabela deixa de ser usada, sem esperar a coleta de lixo
+        self._vistos = [{} if tipo == "texto" else None for tipo in self.tipos]
+        self._codigos = [{valor: codigo for codigo, valor in enumerate(categorias)} if categorias is not None else None
+                         for categorias in self.categorias]
+        constantes = {"_valor": converter_valor, "_data": converter_data, "_internar": _internar,
+                      "_codificar": _codificar, "_completar": _completar}
+        linhas = ["def adicionar(linha):",
+                  f"    if len(linha) != {len(self.colunas)}:",
+                  f"        linha = _completar(linha, {len(self.colunas)})"]
+        for indice, (tipo, buffer) in enumerate(zip(self.tipos, self.dados)):
+            constantes[f"a{indice}"] = buffer.append
+            if tipo == "moeda":
+                constantes[f"a{indice}"] = self.pendentes[indice].append
+                linhas.append(f"    a{indice}(linha[{indice}])")
+            elif tipo == "valor":
+                linhas.append(f"    a{indice}(_valor(linha[{indice}]))")
+            elif tipo == "data":
+                linhas.append(f"    a{indice}(_data(linha[{indice}]))")
+            elif tipo == "texto":
+                constantes[f"t{indice}"] = self._vistos[indice]
+                linhas.append(f"    a{indice}(_internar(t{indice}, linha[{indice}]))")
+            elif tipo == "categoria":
+                constantes[f"c{indice}"] = self._codigos[indice]
+                constantes[f"v{indice}"] = self.categorias[indice]
+                linhas.append(f"    a{indice}(_codificar(c{indice}, v{indice}, linha[{indice}]))")
+            else:
+                linhas.append(f"    a{indice}(linha[{indice}])")
+        if self._moedas:
+            # Todas as colunas "moeda" têm a mesma quantidade de textos pendentes
+            constantes["_pendentes"] = self.pendentes[self._moedas[0]]
+            constantes["_converter"] = _converter_pendentes
+            constantes["_dados"] = self.dados
+            constantes["_todos_pendentes"] = self.pendentes
+            linhas.append(f"    if len(_pendentes) >= {LOTE_MOEDA}:")
+            linhas.append("        _converter(_dados, _todos_pendentes)")
+        exec("\n".join(linhas), constantes)
+        # Tirada do dicionário onde foi criada, para que a função e suas constantes não formem
+        # um ciclo
+        self.append = constantes.pop("adicionar")
+
+    def _converter_pendentes(self):
+        _converter_pendentes(self.dados, self.pendentes)
+
+    def __len__(self):
+        if not self.dados:
+            return 0
+        return len(self.dados[0]) + len(self.pendentes[0] or ())
+
+    def __delitem__(self, indice):
+        # Remove as mesmas linhas de todas as colunas (ex.: del tabela[inicio:])
+        self._converter_pendentes()
+        for buffer in self.dados:
+            del buffer[indice]
+
+    def extend(self, linhas):
+        # Acrescenta outra TabelaNotas (coluna a coluna) ou qualquer sequência de linhas
+        if not isinstance(linhas, TabelaNotas):
+            for linha in linhas:
+                self.append(linha)
+            return
+        if linhas.colunas != self.colunas or linhas.tipos != self.tipos:
+            raise ValueError("As tabelas têm colunas diferentes")
+        # As linhas já convertidas da outra tabela vêm depois das pendentes desta
+        if any(linhas.dados[indice] for indice in self._moedas):
+            self._converter_pendentes()
+        for indice, (buffer, outro, vistos) in enumerate(zip(self.dados, linhas.dados, self._vistos)):
+            if vistos is not None:
+                buffer.extend([_internar(vistos, valor) for valor in outro])
+            elif self.categorias[indice] is not None:
+                # As posições da outra tabela são trocadas pelas desta, todas de uma vez; o -1
+                # dos ausentes pega o último item do mapa, que é o próprio -1
+                mapa = [_codificar(self._codigos[indice], self.categorias[indice], valor) for valor in linhas.categorias[indice]]
+                if len(outro):
+                    codigos = np.array(mapa + [-1], dtype=np.int32)[np.frombuffer(outro, dtype=np.int32)]
+                    buffer.frombytes(codigos.tobytes())
+            else:
+                buffer.extend(outro)
+        for pendentes, outros in zip(self.pendentes, linhas.pendentes):
+            if outros:
+                pendentes.extend(outros)
+        if self._moedas and len(self.pendentes[self._moedas[0]]) >= LOTE_MOEDA:
+            self._converter_pendentes()
+
+    def linhas(self):
+        # Percorre a tabela linha a linha, com os valores já convertidos
+        return zip(*self.para_colunas())
+
+    def para_colunas(self):
+        # Um array NumPy por coluna. Os de "valor", "data" e "moeda" usam a mesma memória dos
+        # buffers, sem cópia (os de "moeda" como arrays inteiros do pandas, com valores
+        # ausentes); os de "categoria" viram Categorical sobre as posições, também sem cópia;
+        # os de texto copiam só as referências das strings (o pandas, ao receber listas, faria
+        # essa mesma cópia bem mais devagar)
+        self._converter_pendentes()
+        colunas = []
+        for tipo, buffer, categorias in zip(self.tipos, self.dados, self.categorias):
+            if tipo == "categoria":
+                codigos = np.frombuffer(buffer, dtype=np.int32) if len(buffer) else np.empty(0, dtype=np.int32)
+                colunas.append(pd.Categorical.from_codes(codigos, categories=pd.Index(categorias, dtype=object)))
+            elif tipo == "moeda":
+                colunas.append(moeda.para_array(np.frombuffer(buffer, dtype=np.int64) if len(buffer) else np.empty(0, dtype=np.int64)))
+            elif tipo == "valor":
+                colunas.append(np.frombuffer(buffer, dtype=np.float64) if len(buffer) else np.empty(0, dtype=np.float64))
+            elif tipo == "data":
+                colunas.append(np.frombuffer(buffer, dtype="datetime64[us]") if len(buffer) else np.empty(0, dtype="datetime64[us]"))
+            else:
+                textos = np.empty(len(buffer), dtype=object)
+                textos[:] = buffer
+                colunas.append(textos)
+        return colunas
+
+    def para_dataframe(self):
+        # Monta o DataFrame direto dos buffers; o pandas só junta as colunas do mesmo tipo em
+        # blocos (uma cópia). Depois disso a tabela não deve receber mais linhas: os arrays
+        # ainda podem estar em uso pelo DataFrame
+        dados = dict(zip(self.colunas, self.para_colunas()))
+        return pd.DataFrame(dados, columns=self.colunas, copy=False)
+
+    def __getstate__(self):
+        # A função gerada não é serializável: só os buffers vão para o pickle (cache e processos)
+        return {"colunas": self.colunas, "tipos": self.tipos, "dados": self.dados, "pendentes": self.pendentes,
+                "categorias": self.categorias}
+
+    def __setstate__(self, estado):
+        self.colunas = estado["colunas"]
+        self.tipos = estado["tipos"]
+        self.dados = estado["dados"]
+        self.pendentes = estado["pendentes"]
+        self.categorias = estado["categorias"]
+        self._moedas = [indice for indice, tipo in enumerate(self.tipos) if tipo == "moeda"]
+        self._preparar()
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import planilha
+
+def _notas_com_ausentes():
+    # Competência vazia (strftime de NaT), campo que o XML não tem e valor ausente
+    return pd.DataFrame({
+        "Número": ["1", "2", "3"],
+        "Competência": pd.Series([pd.NaT, pd.Timestamp("2024-01-01"), pd.NaT]).dt.strftime("%m/%Y"),
+        "Tomador": [None, None, None],
+        "Base de Cálculo": pd.array([1000, None, 250], dtype="Int64"),
+    })
+
+def test_larguras_com_texto_ausente():
+    larguras = planilha.calcular_larguras(_notas_com_ausentes())
+    assert larguras == [len("Número") + 2, len("Competência") + 2, len("Tomador") + 2, len("Base de Cálculo") + 2]
+
+def test_larguras_iguais_a_cada_execucao():
+    df = pd.DataFrame({"Texto": ["x" * (i % 40) for i in range(planilha.TAMANHO_AMOSTRA_LARGURA * 3)]})
+    assert planilha.calcular_larguras(df) == planilha.calcular_larguras(df)
+
+def test_planilha_com_texto_ausente(tmp_path):
+    df = _notas_com_ausentes()
+    arquivo = tmp_path / "notas.xlsx"
+    saida = planilha.PlanilhaNotas(str(arquivo), list(df.columns), None, None, ["Base de Cálculo"])
+    saida.gravar(df)
+    saida.fechar(None)
+    assert arquivo.stat().st_size > 0
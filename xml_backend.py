@@ -0,0 +1,271 @@
+import os
+import re
+import codecs
+import logging
+import xml.etree.ElementTree as ET
+
+# Leitura de XML com o backend mais rápido disponível:
+#   - lxml (libxml2), quando está instalado;
+#   - etree: xml.etree.ElementTree da biblioteca padrão (expat, em C);
+#   - xmltodict: o leitor original, que monta o documento inteiro em dicionários.
+# A escolha automática usa o lxml e, sem ele, o ElementTree. Para forçar um backend, defina a
+# variável de ambiente EASYXML_XML_BACKEND (lxml, etree ou xmltodict) ou chame usar_backend().
+# A escolha é feita no primeiro uso (ver backend()), e só então o lxml é importado: importar este
+# módulo não custa nada ao início da interface e do terminal.
+
+BACKENDS = ("lxml", "etree", "xmltodict")
+VARIAVEL_AMBIENTE = "EASYXML_XML_BACKEND"
+
+_NAO_CARREGADO = object()
+_lxml_etree = _NAO_CARREGADO
+_backend = None
+
+def _lxml():
+    # lxml.etree, importado na primeira chamada; None se não estiver instalado
+    global _lxml_etree
+    if _lxml_etree is _NAO_CARREGADO:
+        try:
+            from lxml import etree
+        except ImportError:
+            etree = None
+        _lxml_etree = etree
+    return _lxml_etree
+
+def backend_disponivel(nome):
+    if nome == "lxml":
+        return _lxml() is not None
+    if nome == "xmltodict":
+        try:
+            import xmltodict
+            return True
+        except ImportError:
+            return False
+    return nome == "etree"
+
+def _escolher_backend():
+    escolhido = os.environ.get(VARIAVEL_AMBIENTE, "").strip().lower()
+    if escolhido:
+        if escolhido not in BACKENDS:
+            logging.warning("Backend de XML desconhecido em %s: %s. Usando a escolha automática", VARIAVEL_AMBIENTE, escolhido)
+        elif not backend_disponivel(escolhido):
+            logging.warning("Backend de XML %s não está instalado. Usando a escolha automática", escolhido)
+        else:
+            return escolhido
+    return "lxml" if _lxml() is not None else "etree"
+
+def backend():
+    # Nome do backend em uso, escolhido na primeira chamada
+    global _backend
+    if _backend is None:
+        _backend = _escolher_backend()
+    return _backend
+
+def usar_backend(nome):
+    # Troca o backend em uso. Também atualiza a variável de ambiente para que os processos de
+    # trabalho iniciados depois usem o mesmo backend
+    global _backend
+    if nome not in BACKENDS:
+        raise ValueError(f"Backend de XML desconhecido: {nome}. Opções: {', '.join(BACKENDS)}")
+    if not backend_disponivel(nome):
+        raise ImportError(f"Backend de XML {nome} não está instalado")
+    _backend = nome
+    os.environ[VARIAVEL_AMBIENTE] = nome
+    logging.info("Backend de XML: %s", nome)
+
+def suporta_streaming():
+    # O xmltodict só sabe montar o documento inteiro; os outros leem elemento por elemento
+    return backend() != "xmltodict"
+
+def nome_local(tag):
+    # Remove o namespace ("{uri}Nome") e devolve apenas o nome local da tag
+    return tag.rsplit('}', 1)[-1]
+
+def namespace(tag):
+    # Devolve o namespace da tag no formato "{uri}" (ou "" se não houver), pronto para
+    # ser concatenado ao nome local
+    return tag[:tag.index('}') + 1] if tag[:1] == '{' else ""
+
+def filho(elemento, nome):
+    # Primeiro filho com o nome local indicado, qualquer que seja o namespace
+    for item in elemento:
+        tag = item.tag
+        # No lxml comentários e instruções de processamento também são filhos, sem tag de texto
+        if isinstance(tag, str) and nome_local(tag) == nome:
+            return item
+    return None
+
+def elemento_para_dict(elemento):
+    # Converte um elemento (ElementTree ou lxml) para a mesma estrutura gerada pelo xmltodict,
+    # assim o código de extração funciona igual em todos os backends
+    resultado = {}
+    for nome, valor in elemento.attrib.items():
+        resultado["@" + nome_local(nome)] = valor
+
+    textos = [elemento.text] if elemento.text else []
+    for item in elemento:
+        if isinstance(item.tag, str):
+            nome = nome_local(item.tag)
+            valor = elemento_para_dict(item)
+            if nome in resultado:
+                if isinstance(resultado[nome], list):
+                    resultado[nome].append(valor)
+                else:
+                    resultado[nome] = [resultado[nome], valor]
+            else:
+                resultado[nome] = valor
+        if item.tail:
+            textos.append(item.tail)
+
+    texto = "".join(textos).strip() or None
+    if not resultado:
+        return texto
+    if texto:
+        resultado["#text"] = texto
+    return resultado
+
+def valor_elemento(elemento):
+    # Valor de um elemento como o xmltodict o entregaria. Elementos simples (só texto), que são
+    # quase todos os campos de uma nota, não passam pela conversão completa
+    if len(elemento) or elemento.attrib:
+        return elemento_para_dict(elemento)
+    texto = elemento.text
+    return (texto.strip() or None) if texto else None
+
+# Quantidade de bytes lida do início do arquivo para identificar o elemento raiz. Se o prólogo
+# (declaração, comentários, DOCTYPE) não couber, a leitura é ampliada até o limite
+TAMANHO_AMOSTRA = 4096
+TAMANHO_MAXIMO_AMOSTRA = 64 * 1024
+
+_PROLOGO = re.compile(r"\s+|<\?.*?\?>|<!--.*?-->|<!DOCTYPE(?:[^\[>]|\[.*?\])*>", re.S)
+_INICIO_RAIZ = re.compile(r"<(?:([A-Za-z_][\w.\-]*):)?([A-Za-z_][\w.\-]*)((?:\s+[^\s=/>]+\s*=\s*(?:\"[^\"]*\"|'[^']*'))*)\s*/?>")
+_INDEFINIDO = object()
+_ATRIBUTO = re.compile(r"([^\s=/>]+)\s*=\s*(?:\"([^\"]*)\"|'([^']*)')")
+
+def _decodificar_amostra(amostra):
+    # Nomes de elementos e namespaces são ASCII: basta tratar UTF-16 e o BOM do UTF-8
+    if amostra.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return amostra.decode("utf-16", errors="ignore")
+    if amostra.startswith(b"<\x00"):
+        return amostra.decode("utf-16-le", errors="ignore")
+    if amostra.startswith(b"\x00<"):
+        return amostra.decode("utf-16-be", errors="ignore")
+    if amostra.startswith(codecs.BOM_UTF8):
+        amostra = amostra[len(codecs.BOM_UTF8):]
+    return amostra.decode("latin-1")
+
+def _ler_raiz_amostra(xml_file):
+    # Procura a tag de abertura do elemento raiz no início do arquivo. Retorna (nome, namespace),
+    # None se o arquivo não começa como um XML ou _INDEFINIDO se não foi possível decidir
+    tamanho = TAMANHO_AMOSTRA
+    while True:
+        xml_file.seek(0)
+        amostra = xml_file.read(tamanho)
+        texto = _decodificar_amostra(amostra)
+
+        posicao = 0
+        while True:
+            prologo = _PROLOGO.match(texto, posicao)
+            if not prologo or prologo.end() == posicao:
+                break
+            posicao = prologo.end()
+
+        raiz = _INICIO_RAIZ.match(texto, posicao)
+        if raiz:
+            prefixo, nome, atributos = raiz.groups()
+            declaracao = "xmlns:" + prefixo if prefixo else "xmlns"
+            namespace = ""
+            for atributo in _ATRIBUTO.finditer(atributos):
+                if atributo.group(1) == declaracao:
+                    namespace = atributo.group(2) if atributo.group(2) is not None else atributo.group(3)
+            return nome, namespace
+
+        if texto[:1] not in ("<", "") and not texto[:1].isspace():
+            return None
+        # Prólogo ou tag raiz incompletos na amostra: lê mais, se o arquivo tiver mais
+        if len(amostra) < tamanho or tamanho >= TAMANHO_MAXIMO_AMOSTRA:
+            return _INDEFINIDO
+        tamanho *= 4
+
+def _ler_raiz_parser(xml_file):
+    # Usa o parser só até o evento de abertura do elemento raiz
+    modulo = _lxml() if backend() == "lxml" else ET
+    xml_file.seek(0)
+    try:
+        for _, elemento in modulo.iterparse(xml_file, events=("start",)):
+            return nome_local(elemento.tag), namespace(elemento.tag)[1:-1]
+    except Exception:
+        return None
+    return None
+
+def ler_raiz(xml_file):
+    # Identifica o elemento raiz e o seu namespace lendo só o início do arquivo, sem fazer o
+    # parse do documento. Retorna (nome_local, namespace) ou None se não for um XML. Volta ao
+    # início do arquivo ao terminar
+    try:
+        raiz = _ler_raiz_amostra(xml_file)
+        if raiz is _INDEFINIDO:
+            # Início fora do comum (ex.: DOCTYPE com "]" dentro de aspas): o parser decide
+            raiz = _ler_raiz_parser(xml_file)
+        return raiz
+    finally:
+        xml_file.seek(0)
+
+def identificar_raiz(xml_file):
+    # Nome local do elemento raiz (ver ler_raiz) ou None
+    raiz = ler_raiz(xml_file)
+    return raiz[0] if raiz else None
+
+def _iterar_filhos_lxml(xml_file, pai, nome):
+    # O lxml filtra as tags em C, então o Python só vê os elementos procurados
+    for _, elemento in _lxml().iterparse(xml_file, events=("end",), tag="{*}" + nome, huge_tree=True, resolve_entities=False):
+        elemento_pai = elemento.getparent()
+        if elemento_pai is not None and nome_local(elemento_pai.tag) == pai and elemento_pai.getparent() is not None and elemento_pai.getparent().getparent() is None:
+            yield elemento
+            # Descarta a nota já processada (e o que veio antes dela) para não acumular a lista na memória
+            elemento.clear()
+            while elemento.getprevious() is not None:
+                del elemento_pai[0]
+
+def _iterar_filhos_etree(xml_file, pai, nome):
+    profundidade = 0
+    elemento_pai = None
+    for evento, elemento in ET.iterparse(xml_file, events=("start", "end")):
+        if evento == "start":
+            profundidade += 1
+            if profundidade == 2 and nome_local(elemento.tag) == pai:
+                elemento_pai = elemento
+            continue
+
+        if profundidade == 3 and elemento_pai is not None:
+            if nome_local(elemento.tag) == nome:
+                yield elemento
+            # Descarta a nota já processada para não acumular a lista na memória
+            elemento_pai.clear()
+        elif profundidade == 2:
+            if elemento is elemento_pai:
+                elemento_pai = None
+            elemento.clear()
+        profundidade -= 1
+
+def iterar_filhos(xml_file, pai, nome):
+    # Percorre o documento em modo streaming, entregando um por vez os elementos `nome` que
+    # estão dentro de um elemento `pai` logo abaixo da raiz (ex.: ListaNfse/CompNfse). Cada
+    # elemento entregue é descartado da árvore assim que o próximo é pedido, então o uso de
+    # memória não depende do tamanho do arquivo.
+    if backend() == "lxml":
+        return _iterar_filhos_lxml(xml_file, pai, nome)
+    return _iterar_filhos_etree(xml_file, pai, nome)
+
+def parse(xml_file):
+    # Lê o documento inteiro e devolve um dicionário no formato do xmltodict
+    nome = backend()
+    if nome == "xmltodict":
+        import xmltodict
+        return xmltodict.parse(xml_file)
+    if nome == "lxml":
+        lxml_etree = _lxml()
+        parser = lxml_etree.XMLParser(huge_tree=True, resolve_entities=False, remove_comments=True, remove_pis=True)
+        raiz = lxml_etree.parse(xml_file, parser).getroot()
+    else:
+        raiz = ET.parse(xml_file).getroot()
+    return {nome_local(raiz.tag): elemento_para_dict(raiz)}